@@ -0,0 +1,316 @@
+"""
+Сравнительный замер кодирования Хаффмана, tANS и кодеков стандартной библиотеки
+
+    python benchmark.py [--codecs=имя,...] [--json=файл|-] [файл ...]
+    python benchmark.py --stress[=потоков] [файл ...]
+
+По умолчанию используются файлы проекта (test.txt, README.md и исходники).
+Для каждого файла и кодека измеряются степень сжатия, скорость
+сжатия/распаковки (МБ/с исходных данных) и пиковый RSS. Каждый замер
+идёт в отдельном процессе, чтобы пиковый RSS относился только к нему.
+Результат - таблица в stdout и, с --json, тот же отчёт в JSON.
+В конце замеряется время запуска CLI в конвейерном режиме.
+
+--stress - нагрузочная проверка Codebook: одна кодовая книга
+одновременно кодирует и декодирует фрагменты файла из многих потоков
+и из рабочих процессов (книга передаётся им через pickle); результаты
+сверяются с последовательным прогоном.
+"""
+
+import contextlib
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+HERE = Path(__file__).parent
+
+DEFAULT_FILES = ['test.txt', 'README.md', 'huffman.py', 'huffman_gui.py']
+
+# Имя -> (модуль, параметры): для huffman - аргументы compress_file,
+# для остальных - уровень сжатия
+CODECS = {
+    'huffman': ('huffman', {}),
+    'huffman-o1': ('huffman', {'order': 1}),
+    'huffman-words': ('huffman', {'merge': 'words'}),
+    'huffman-s4': ('huffman', {'streams': 4}),
+    'huffman-sample': ('huffman', {'sample': 1 << 20}),
+    'tans': ('huffman', {'backend': 'tans'}),
+    'tans-o1': ('huffman', {'backend': 'tans', 'order': 1}),
+    'zlib-1': ('zlib', 1),
+    'zlib-6': ('zlib', 6),
+    'zlib-9': ('zlib', 9),
+    'bz2-1': ('bz2', 1),
+    'bz2-9': ('bz2', 9),
+    'lzma-0': ('lzma', 0),
+    'lzma-6': ('lzma', 6),
+}
+
+# Число повторов замера времени (берётся лучший)
+REPEAT = 3
+
+# Число фрагментов в нагрузочной проверке Codebook
+STRESS_TASKS = 2000
+
+
+def best_time(func, repeat=REPEAT):
+    """Лучшее время из repeat вызовов func и результат последнего вызова"""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+
+def peak_rss_mb():
+    """Пиковый RSS текущего процесса в МБ (None, если модуля resource нет)"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux отдаёт КБ, macOS - байты
+    return rss / 1024 ** 2 if sys.platform == 'darwin' else rss / 1024
+
+
+def run_huffman(path, params):
+    """Сжатие и распаковка через compress_file/decompress_file"""
+    from huffman import compress_file, decompress_file
+
+    with tempfile.TemporaryDirectory() as tmp:
+        packed = os.path.join(tmp, 'packed.bin')
+        unpacked = os.path.join(tmp, 'unpacked.txt')
+
+        # Диагностика кодировщика здесь не нужна
+        with contextlib.redirect_stderr(io.StringIO()):
+            compress_time, _ = best_time(lambda: compress_file(path, packed, **params))
+            decompress_time, _ = best_time(lambda: decompress_file(packed, unpacked))
+
+        if Path(path).read_bytes() != Path(unpacked).read_bytes():
+            raise RuntimeError(f'{path}: распакованный файл не совпадает с исходным')
+        return os.path.getsize(packed), compress_time, decompress_time
+
+
+def run_stdlib(path, module_name, level):
+    """Сжатие и распаковка в памяти кодеком zlib, bz2 или lzma"""
+    import importlib
+
+    module = importlib.import_module(module_name)
+    data = Path(path).read_bytes()
+    if module_name == 'lzma':
+        compress = lambda: module.compress(data, preset=level)
+    elif module_name == 'bz2':
+        compress = lambda: module.compress(data, compresslevel=level)
+    else:
+        compress = lambda: module.compress(data, level)
+
+    compress_time, packed = best_time(compress)
+    decompress_time, unpacked = best_time(lambda: module.decompress(packed))
+    if unpacked != data:
+        raise RuntimeError(f'{path}: {module_name} вернул другие данные')
+    return len(packed), compress_time, decompress_time
+
+
+def run_codec(name, path):
+    """Один замер (выполняется в отдельном процессе)"""
+    module_name, params = CODECS[name]
+    if module_name == 'huffman':
+        compressed, compress_time, decompress_time = run_huffman(path, params)
+    else:
+        compressed, compress_time, decompress_time = run_stdlib(path, module_name, params)
+
+    original = os.path.getsize(path)
+    return {
+        'file': path,
+        'codec': name,
+        'original': original,
+        'compressed': compressed,
+        'ratio': (1 - compressed / original) * 100 if original else 0.0,
+        'compress_mbs': speed(original, compress_time),
+        'decompress_mbs': speed(original, decompress_time),
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+
+def measure(name, path):
+    """Запуск run_codec в дочернем процессе"""
+    result = subprocess.run(
+        [sys.executable, __file__, '--worker', name, path],
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=False, cwd=HERE,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f'{name} на {path}:\n{result.stderr.decode(errors="replace")}')
+    return json.loads(result.stdout)
+
+
+def startup_time(runs=10):
+    """Время запуска интерпретатора и `huffman.py compress - -` на крошечном входе, мс
+
+    Берётся лучшее из runs запусков.
+    """
+    script = str(HERE / 'huffman.py')
+
+    def best(args):
+        times = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            subprocess.run(args, input=b'hello', stdout=subprocess.DEVNULL,
+                           stderr=subprocess.DEVNULL, check=True)
+            times.append(time.perf_counter() - start)
+        return min(times) * 1000
+
+    return best([sys.executable, '-c', 'pass']), best([sys.executable, script, 'compress', '-', '-'])
+
+
+def stress_piece(text, i):
+    """i-й фрагмент текста для нагрузочной проверки (детерминированный)"""
+    start = i * 7919 % len(text)
+    return text[start:start + 1 + i * 31 % 4096]
+
+
+def stress_task(codebook, text, i):
+    """Кодирование и декодирование i-го фрагмента, возвращает закодированные байты"""
+    piece = stress_piece(text, i)
+    data = codebook.encode(piece)
+    if codebook.decode(data, len(piece)) != piece:
+        raise RuntimeError(f'фрагмент {i}: декодирование не совпало')
+    return data
+
+
+_stress_state = None
+
+
+def init_stress_worker(codebook, text):
+    """Кодовая книга и текст рабочего процесса (приходят через pickle)"""
+    global _stress_state
+    _stress_state = codebook, text
+
+
+def stress_worker(i):
+    return stress_task(*_stress_state, i)
+
+
+def stress(path, threads):
+    """Одновременное кодирование/декодирование одной Codebook потоками и процессами"""
+    import pickle
+    from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+    from huffman import HuffmanCoder
+
+    text = Path(path).read_text(encoding='utf-8')
+    codebook = HuffmanCoder().build_codes(text)
+    tasks = range(STRESS_TASKS)
+    size = sum(len(stress_piece(text, i).encode('utf-8')) for i in tasks)
+
+    start = time.perf_counter()
+    expected = [stress_task(codebook, text, i) for i in tasks]
+    sequential = time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(threads) as executor:
+        in_threads = list(executor.map(lambda i: stress_task(codebook, text, i), tasks))
+    threaded = time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(threads, initializer=init_stress_worker,
+                             initargs=(codebook, text)) as executor:
+        in_processes = list(executor.map(stress_worker, tasks, chunksize=64))
+    processes = time.perf_counter() - start
+
+    if in_threads != expected or in_processes != expected:
+        raise RuntimeError(f'{path}: результаты параллельного прогона отличаются')
+    print(f"{Path(path).name}: {STRESS_TASKS} фрагментов, {size} байт; "
+          f"pickle книги {len(pickle.dumps(codebook))} байт")
+    print(f"  последовательно {speed(size, sequential):.2f} МБ/с, "
+          f"{threads} потоков {speed(size, threaded):.2f} МБ/с, "
+          f"{threads} процессов {speed(size, processes):.2f} МБ/с - результаты совпадают")
+
+
+def speed(size, seconds):
+    """Скорость в МБ/с"""
+    return size / seconds / 1e6 if seconds > 0 else float('inf')
+
+
+def print_table(results, file=None):
+    print(f"{'Файл':<16} {'Кодек':<14} {'Размер':>9} {'Сжатие':>8} "
+          f"{'Сжатие МБ/с':>12} {'Распаковка МБ/с':>16} {'Пик RSS МБ':>11}", file=file)
+    for r in results:
+        rss = f"{r['peak_rss_mb']:.1f}" if r['peak_rss_mb'] is not None else '-'
+        print(f"{Path(r['file']).name:<16} {r['codec']:<14} {r['compressed']:>9} "
+              f"{r['ratio']:>7.1f}% {r['compress_mbs']:>12.2f} "
+              f"{r['decompress_mbs']:>16.2f} {rss:>11}", file=file)
+
+
+def main():
+    if sys.argv[1:2] == ['--worker']:
+        json.dump(run_codec(sys.argv[2], sys.argv[3]), sys.stdout)
+        return
+
+    options = {}
+    files = []
+    for arg in sys.argv[1:]:
+        if arg.startswith('--'):
+            key, _, value = arg[2:].partition('=')
+            options[key] = value
+        else:
+            files.append(os.path.abspath(arg))
+    files = files or [str(HERE / name) for name in DEFAULT_FILES]
+    if 'stress' in options:
+        for path in files:
+            stress(path, int(options['stress'] or os.cpu_count() or 4))
+        return
+    codecs = options['codecs'].split(',') if options.get('codecs') else list(CODECS)
+    unknown = set(codecs) - set(CODECS)
+    if unknown:
+        sys.exit(f"Неизвестные кодеки: {', '.join(sorted(unknown))}; есть: {', '.join(CODECS)}")
+
+    results = []
+    for path in files:
+        for name in codecs:
+            print(f"\r{Path(path).name}: {name}...".ljust(60), end='', file=sys.stderr, flush=True)
+            results.append(measure(name, path))
+    print(file=sys.stderr)
+
+    # При --json=- stdout занят отчётом, таблица и итоги уходят в stderr
+    json_to_stdout = options.get('json') in ('', '-') and 'json' in options
+    out = sys.stderr if json_to_stdout else sys.stdout
+    print_table(results, file=out)
+
+    # Выигрыш контекстной модели относительно order-0 и tANS относительно Хаффмана
+    by_key = {(r['file'], r['codec']): r for r in results}
+    pairs = [('huffman', 'huffman-o1', 'order-1 против order-0'),
+             ('huffman', 'tans', 'tANS против Хаффмана')]
+    for path in files:
+        for base_name, other_name, title in pairs:
+            base, other = by_key.get((path, base_name)), by_key.get((path, other_name))
+            if not (base and other):
+                continue
+            delta = other['compressed'] - base['compressed']
+            print(f"  {Path(path).name}: {title} {delta:+d} байт "
+                  f"({delta * 100 / base['compressed']:+.1f}%), скорость сжатия "
+                  f"x{other['compress_mbs'] / base['compress_mbs']:.2f}, распаковки "
+                  f"x{other['decompress_mbs'] / base['decompress_mbs']:.2f}", file=out)
+
+    interpreter, cli = startup_time()
+    print(f"\nЗапуск CLI (compress - -): {cli:.1f} мс, "
+          f"из них интерпретатор {interpreter:.1f} мс", file=out)
+
+    if 'json' in options:
+        report = {
+            'results': results,
+            'startup_ms': {'interpreter': interpreter, 'cli': cli},
+        }
+        if json_to_stdout:
+            json.dump(report, sys.stdout, ensure_ascii=False, indent=2)
+            print()
+        else:
+            with open(options['json'], 'w', encoding='utf-8') as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
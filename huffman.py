@@ -1,6 +1,75 @@
 import sys
-from pathlib import Path
-import pickle
+import heapq
+import zlib
+import io
+import math
+from array import array
+
+MAGIC = b'HUFF'
+FORMAT_VERSION = 4
+
+# Число символов алфавита в одном блоке архива
+BLOCK_SIZE = 1 << 18
+
+# Способы хранения блока
+METHOD_STORED = 0   # исходный текст в UTF-8
+METHOD_RLE = 1      # один символ, повторённый length раз
+METHOD_ENTROPY = 2  # кодер, указанный в заголовке (Хаффман или tANS)
+METHOD_INTERLEAVED = 3  # то же с чередованием подпотоков
+
+METHOD_NAMES = {
+    METHOD_STORED: 'без сжатия',
+    METHOD_RLE: 'RLE',
+    METHOD_ENTROPY: 'энтропийное',
+    METHOD_INTERLEAVED: 'энтропийное, подпотоки',
+}
+
+# Число бит, просматриваемых табличным декодером за один шаг
+TABLE_BITS = 11
+
+# Пределы log2 размера таблиц tANS, выбираемого по данным (для больших
+# алфавитов таблицы бывают и крупнее TANS_MAX_LOG)
+TANS_LOG = 11
+TANS_MAX_LOG = 14
+
+# Предел числа многосимвольных единиц, добавляемых к алфавиту
+MERGE_LIMIT = 256
+
+# Символ выхода для символов, которых не было в выборке (однопроходный
+# режим). Пустая строка не бывает символом текста, поэтому в алфавите
+# заголовка она однозначна. После ESC общей таблицы идёт код символа
+# из LITERAL_BITS бит.
+ESCAPE = ''
+LITERAL_BITS = 21
+
+# Выборка для статистики (однопроходный режим, приблизительное дерево
+# в GUI): SAMPLE_WINDOWS окон, по умолчанию по SAMPLE_WINDOW байт,
+# равномерно разнесённых по файлу. Вход читается порциями по READ_CHUNK
+SAMPLE_WINDOWS = 64
+SAMPLE_WINDOW = 16 * 1024
+READ_CHUNK = 1 << 20
+
+# Модули, нужные не при каждом запуске (re, collections, pickle,
+# concurrent.futures), импортируются внутри функций: так короче
+# запуск CLI в конвейерах и для маленьких файлов
+
+
+class ArchiveError(ValueError):
+    """Повреждённый или обрезанный архив"""
+
+
+class CrcReader:
+    """Обёртка над файлом, считающая CRC32 всех прочитанных байтов"""
+    
+    def __init__(self, file):
+        self.file = file
+        self.crc = 0
+    
+    def read(self, size=-1):
+        data = self.file.read(size)
+        self.crc = zlib.crc32(data, self.crc)
+        return data
+
 
 class BitWriter:
     def __init__(self, file):
@@ -16,6 +85,16 @@ class BitWriter:
             self.byte = 0
             self.bit_count = 0
     
+    def write_bits(self, value, count):
+        """Запись count младших битов value (старший бит первым)"""
+        self.byte = (self.byte << count) | value
+        self.bit_count += count
+        if self.bit_count >= 8:
+            rest = self.bit_count & 7
+            self.file.write((self.byte >> rest).to_bytes(self.bit_count >> 3, 'big'))
+            self.byte &= (1 << rest) - 1
+            self.bit_count = rest
+    
     def flush(self):
         if self.bit_count > 0:
             self.byte <<= (8 - self.bit_count)
@@ -37,13 +116,271 @@ class BitReader:
             self.bit_count = 8
         self.bit_count -= 1
         return (self.byte >> self.bit_count) & 1
+    
+    def peek_bits(self, count):
+        """Следующие count бит без продвижения (за концом данных - нули)"""
+        while self.bit_count < count:
+            byte = self.data[self.pos] if self.pos < len(self.data) else 0
+            self.pos += 1
+            self.byte = ((self.byte & ((1 << self.bit_count) - 1)) << 8) | byte
+            self.bit_count += 8
+        return (self.byte >> (self.bit_count - count)) & ((1 << count) - 1)
+    
+    def skip_bits(self, count):
+        """Пропуск count бит, уже просмотренных peek_bits"""
+        self.bit_count -= count
+
+class HuffmanTree:
+    """Компактное дерево Хаффмана на параллельных массивах
+
+    Узел - это индекс. Листья занимают индексы 0..len(symbols)-1,
+    внутренние узлы идут следом. Отсутствующий потомок/родитель - -1,
+    у внутренних узлов symbol == -1.
+    """
+    __slots__ = ('symbols', 'symbol', 'weight', 'left', 'right', 'parent', 'root')
+
+    def __init__(self, symbols):
+        self.symbols = list(symbols)
+        self.symbol = array('i')
+        self.weight = array('q')
+        self.left = array('i')
+        self.right = array('i')
+        self.parent = array('i')
+        self.root = -1
+
+    def __len__(self):
+        return len(self.symbol)
+
+    def add_node(self, symbol=-1, weight=0, left=-1, right=-1):
+        """Добавление узла, возвращает его индекс"""
+        index = len(self.symbol)
+        self.symbol.append(symbol)
+        self.weight.append(weight)
+        self.left.append(left)
+        self.right.append(right)
+        self.parent.append(-1)
+        if left >= 0:
+            self.parent[left] = index
+        if right >= 0:
+            self.parent[right] = index
+        return index
+
+    def is_leaf(self, index):
+        return self.symbol[index] >= 0
+
+    def char(self, index):
+        """Символ листа (None для внутреннего узла)"""
+        symbol = self.symbol[index]
+        return self.symbols[symbol] if symbol >= 0 else None
+
+    def node(self, index=None):
+        """Объектное представление узла (по умолчанию корня)"""
+        if index is None:
+            index = self.root
+        return Node(self, index) if index >= 0 else None
+
+    @classmethod
+    def from_freq(cls, freq_dict):
+        """Построение дерева по таблице частот
+
+        Порядок слияния совпадает с прежней реализацией (устойчивая
+        сортировка по частоте, новый узел - в конец списка), поэтому
+        старые архивы декодируются тем же деревом.
+        """
+        if not freq_dict:
+            return None
+
+        tree = cls(freq_dict)
+        heap = []
+        for i, freq in enumerate(freq_dict.values()):
+            tree.add_node(i, freq)
+            heap.append((freq, i))
+        heapq.heapify(heap)
+
+        # Индекс узла растёт монотонно, поэтому он же служит
+        # порядковым номером при равных частотах
+        while len(heap) > 1:
+            left_freq, left = heapq.heappop(heap)
+            right_freq, right = heapq.heappop(heap)
+            parent = tree.add_node(-1, left_freq + right_freq, left, right)
+            heapq.heappush(heap, (left_freq + right_freq, parent))
+
+        tree.root = heap[0][1]
+        return tree
+
+    @classmethod
+    def from_code_lengths(cls, lengths, freq=None):
+        """Построение канонического дерева по длинам кодов {символ: длина}
+
+        freq - частоты символов для весов узлов (нужны только для показа).
+        """
+        if not lengths:
+            return None
+
+        tree = cls(lengths)
+        for i, char in enumerate(tree.symbols):
+            tree.add_node(i, freq[char] if freq else 0)
+
+        if len(tree.symbols) == 1:
+            tree.root = 0
+            return tree
+
+        tree.root = tree.add_node()
+        for i, code in enumerate(canonical_codes(lengths).values()):
+            node = tree.root
+            for bit in code[:-1]:
+                child = tree.right[node] if bit == '1' else tree.left[node]
+                if child < 0:
+                    child = tree.add_node()
+                    tree.parent[child] = node
+                    if bit == '1':
+                        tree.right[node] = child
+                    else:
+                        tree.left[node] = child
+                node = child
+            tree.parent[i] = node
+            if code[-1] == '1':
+                tree.right[node] = i
+            else:
+                tree.left[node] = i
+
+        if freq:
+            # Родитель добавлен раньше детей - веса суммируются снизу вверх
+            for node in range(len(tree) - 1, len(tree.symbols) - 1, -1):
+                tree.weight[node] = tree.weight[tree.left[node]] + tree.weight[tree.right[node]]
+        return tree
+
+    def max_depth(self):
+        """Длина самого длинного кода"""
+        return max((len(code) for code in self.codes().values()), default=0)
+
+    def decode_table(self, bits, multi=False):
+        """Таблица декодирования по следующим bits битам потока
+
+        Возвращает списки (выход, число символов, число бит, узел) на все
+        2**bits значений. В многосимвольной таблице (multi=True) выход -
+        строка из всех кодов, целиком поместившихся в bits бит. Если код
+        длиннее bits, число символов равно 0, а узел - вершина дерева,
+        достигнутая после bits бит (дальше декодируем по одному биту).
+        """
+        size = 1 << bits
+        mask = size - 1
+        out = [None] * size
+        counts = [0] * size
+        lengths = [bits] * size
+        nodes = [-1] * size
+
+        for char, code in self.codes().items():
+            if len(code) <= bits:
+                start = int(code, 2) << (bits - len(code))
+                end = start + (1 << (bits - len(code)))
+                out[start:end] = [char] * (end - start)
+                counts[start:end] = [1] * (end - start)
+                lengths[start:end] = [len(code)] * (end - start)
+
+        for value in range(size):
+            if counts[value]:
+                continue
+            node = self.root
+            for shift in range(bits - 1, -1, -1):
+                node = self.right[node] if (value >> shift) & 1 else self.left[node]
+            nodes[value] = node
+
+        if not multi:
+            return out, counts, lengths, nodes
+
+        first_out = out[:]
+        first_lengths = lengths[:]
+        for value in range(size):
+            if not counts[value]:
+                continue
+            parts = [out[value]]
+            used = lengths[value]
+            while used < bits:
+                rest = (value << used) & mask
+                if not counts[rest] or first_lengths[rest] > bits - used:
+                    break
+                parts.append(first_out[rest])
+                used += first_lengths[rest]
+            if len(parts) > 1:
+                out[value] = ''.join(parts)
+                counts[value] = len(parts)
+                lengths[value] = used
+
+        return out, counts, lengths, nodes
+
+    def codes(self):
+        """Таблица кодов {символ: строка из '0'/'1'}"""
+        codes = {}
+        if self.root < 0:
+            return codes
+        if self.is_leaf(self.root):
+            codes[self.symbols[self.symbol[self.root]]] = '0'
+            return codes
+
+        stack = [(self.root, '')]
+        while stack:
+            index, code = stack.pop()
+            symbol = self.symbol[index]
+            if symbol >= 0:
+                codes[self.symbols[symbol]] = code
+            else:
+                stack.append((self.right[index], code + '1'))
+                stack.append((self.left[index], code + '0'))
+        return codes
+
 
 class Node:
-    def __init__(self, char=None, freq=0):
-        self.char = char
-        self.freq = freq
-        self.left = None
-        self.right = None
+    """Представление узла HuffmanTree (для совместимости)"""
+    __slots__ = ('tree', 'index')
+
+    def __init__(self, tree, index):
+        self.tree = tree
+        self.index = index
+
+    @property
+    def char(self):
+        return self.tree.char(self.index)
+
+    @property
+    def freq(self):
+        return self.tree.weight[self.index]
+
+    @property
+    def left(self):
+        return self.tree.node(self.tree.left[self.index])
+
+    @property
+    def right(self):
+        return self.tree.node(self.tree.right[self.index])
+
+    def __eq__(self, other):
+        return (isinstance(other, Node) and self.tree is other.tree
+                and self.index == other.index)
+
+    def __hash__(self):
+        return hash((id(self.tree), self.index))
+
+
+def canonical_codes(lengths):
+    """Канонические коды по длинам {символ: длина}
+
+    Символы с равной длиной упорядочиваются так же, как в словаре lengths.
+    """
+    if len(lengths) == 1:
+        return {symbol: '0' for symbol in lengths}
+
+    codes = {}
+    code = 0
+    prev_length = 0
+    for symbol in sorted(lengths, key=lengths.get):
+        length = lengths[symbol]
+        code <<= length - prev_length
+        codes[symbol] = format(code, f'0{length}b')
+        code += 1
+        prev_length = length
+    return {symbol: codes[symbol] for symbol in lengths}
+
 
 class HuffmanCoder:
     def __init__(self):
@@ -51,59 +388,53 @@ class HuffmanCoder:
         self.reverse_codes = {}
         self.tree = None
     
+    @classmethod
+    def from_code_lengths(cls, lengths):
+        """Кодировщик с каноническими кодами по длинам {символ: длина}"""
+        coder = cls()
+        coder.tree = HuffmanTree.from_code_lengths(lengths)
+        coder._generate_codes(coder.tree)
+        return coder
+    
     def build_tree(self, freq_dict):
         """Построение дерева Хаффмана"""
-        if not freq_dict:
-            return None
-        
-        # Создаём узлы
-        nodes = [Node(char, freq) for char, freq in freq_dict.items()]
-        
-        if len(nodes) == 1:
-            # Особый случай - один уникальный символ
-            return nodes[0]
-        
-        # Строим дерево
-        while len(nodes) > 1:
-            nodes.sort(key=lambda x: x.freq)
-            
-            left = nodes.pop(0)
-            right = nodes.pop(0)
-            
-            parent = Node(None, left.freq + right.freq)
-            parent.left = left
-            parent.right = right
-            
-            nodes.append(parent)
-        
-        return nodes[0]
+        return HuffmanTree.from_freq(freq_dict)
     
-    def _generate_codes(self, node, code=''):
+    def _generate_codes(self, tree):
         """Генерация кодов"""
-        if node:
-            if node.char is not None:
-                self.codes[node.char] = code if code else '0'
-                self.reverse_codes[code if code else '0'] = node.char
-            else:
-                self._generate_codes(node.left, code + '0')
-                self._generate_codes(node.right, code + '1')
+        if tree is not None:
+            self.codes.update(tree.codes())
+            self.reverse_codes.update({code: char for char, code in self.codes.items()})
     
     def build_codes(self, text):
-        """Построение кодов из текста"""
-        # Подсчёт частот
-        freq = {}
-        for char in text:
-            freq[char] = freq.get(char, 0) + 1
+        """Построение кодов из текста, возвращает Codebook"""
+        from collections import Counter
         
-        # Построение дерева
-        self.tree = self.build_tree(freq)
+        # Подсчёт частот
+        freq = Counter(text)
+        return self.build_codes_from_freq(freq)
+    
+    def build_codes_from_freq(self, freq):
+        """Построение кодов по готовой таблице частот, возвращает Codebook
+
+        Кодовая книга неизменяема и не зависит от дальнейших вызовов
+        build_codes: её можно отдавать другим потокам и процессам.
+        Коды и дерево кодировщика - те же канонические, что в книге.
+        """
+        # Дерево Хаффмана нужно только для длин кодов
+        tree = self.build_tree(freq)
+        lengths = {char: len(code) for char, code in tree.codes().items()} if tree else {}
+        codebook = Codebook(lengths)
         
-        # Генерация кодов
+        self.tree = HuffmanTree.from_code_lengths(lengths, freq)
         self.codes = {}
         self.reverse_codes = {}
         self._generate_codes(self.tree)
-        
-        return freq
+        return codebook
+    
+    def code_lengths(self):
+        """Длины кодов {символ: длина}"""
+        return {char: len(code) for char, code in self.codes.items()}
     
     def encode(self, text):
         """Кодирование текста"""
@@ -114,127 +445,1634 @@ class HuffmanCoder:
     
     def decode_with_tree(self, reader, length):
         """Декодирование с использованием дерева"""
-        result = []
+        tree = self.tree
+        symbols = tree.symbols
+        symbol = tree.symbol
+        left = tree.left
+        right = tree.right
+        root = tree.root
+        
+        if symbol[root] >= 0:
+            # Один уникальный символ
+            return [symbols[symbol[root]]] * length
         
+        result = []
+        read_bit = reader.read_bit
         for _ in range(length):
-            if self.tree.char is not None:
-                # Один уникальный символ
-                result.append(self.tree.char)
-            else:
-                node = self.tree
-                while node.char is None:
-                    bit = reader.read_bit()
-                    node = node.left if bit == 0 else node.right
-                result.append(node.char)
+            node = root
+            while symbol[node] < 0:
+                node = right[node] if read_bit() else left[node]
+            result.append(symbols[symbol[node]])
         
         return result
+    
+    def decode_with_table(self, reader, length, multi=True):
+        """Табличное декодирование: несколько символов за один просмотр
+
+        Возвращает список фрагментов текста (не отдельных символов);
+        при multi=False - список отдельных символов.
+        """
+        tree = self.tree
+        if tree.is_leaf(tree.root):
+            return [tree.char(tree.root)] * length
+        
+        single = tree.decode_table(TABLE_BITS)
+        multi = tree.decode_table(TABLE_BITS, multi=True) if multi else single
+        return _decode_with_tables(reader, length, tree, TABLE_BITS, single, multi)
+
 
-def compress_file(input_path, output_path):
-    """Сжатие файла"""
-    print(f"Чтение {input_path}...", flush=True)
-    with open(input_path, 'r', encoding='utf-8') as f:
-        text = f.read()
+def _decode_with_tables(reader, length, tree, bits, single, multi):
+    """Цикл табличного декодирования по готовым таблицам decode_table
+
+    Многосимвольная таблица multi используется, пока её фрагмент
+    не выходит за length символов.
+    """
+    symbols, symbol, left, right = tree.symbols, tree.symbol, tree.left, tree.right
+    peek_bits = reader.peek_bits
+    skip_bits = reader.skip_bits
+    read_bit = reader.read_bit
     
-    if not text:
-        print("Файл пустой!")
-        return
+    result = []
+    produced = 0
+    while produced < length:
+        value = peek_bits(bits)
+        out, counts, lengths, nodes = multi if produced + multi[1][value] <= length else single
+        count = counts[value]
+        skip_bits(lengths[value])
+        if count:
+            result.append(out[value])
+            produced += count
+        else:
+            # Код длиннее таблицы - дочитываем по одному биту
+            node = nodes[value]
+            while symbol[node] < 0:
+                node = right[node] if read_bit() else left[node]
+            result.append(symbols[symbol[node]])
+            produced += 1
     
-    print(f"Размер: {len(text)} символов", flush=True)
-    print("Построение дерева Хаффмана...", flush=True)
+    return result
+
+
+class Codebook:
+    """Скомпилированные канонические коды Хаффмана, неизменяемые
+
+    Строится по длинам кодов {символ: длина} (равные длины упорядочены
+    как в словаре) и сразу содержит таблицу кодирования
+    {символ: (код, число бит)} и таблицы декодирования. Атрибуты после
+    создания не меняются, словари lengths и encode_table доступны только
+    для чтения, дерево декодирования скрыто, а состояние кодирования и декодирования -
+    локальные переменные вызова, поэтому один экземпляр без блокировок
+    используют сколько угодно потоков. pickle передаёт только длины
+    (таблицы строятся заново), и книга дёшево уходит в рабочие процессы.
+
+    Единственный символ кодируется нулём бит. multi=False - без
+    многосимвольной таблицы (дешевле для контекстных таблиц).
+    """
+    __slots__ = ('lengths', 'encode_table', '_tree', 'bits', 'single', 'multi')
     
-    # Создаём кодировщик
-    coder = HuffmanCoder()
-    freq = coder.build_codes(text)
+    def __init__(self, lengths, multi=True):
+        import types
+        
+        lengths = dict(lengths)
+        tree = HuffmanTree.from_code_lengths(lengths)
+        if tree is None:
+            encode_table, bits, single = {}, 0, None
+        elif tree.is_leaf(tree.root):
+            char = tree.char(tree.root)
+            encode_table = {char: (0, 0)}
+            bits, single = 0, ((char,), (1,), (0,), (-1,))
+        else:
+            encode_table = {char: (int(code, 2), len(code)) for char, code in tree.codes().items()}
+            bits = min(TABLE_BITS, tree.max_depth())
+            single = tuple(map(tuple, tree.decode_table(bits)))
+        if multi and bits:
+            multi = tuple(map(tuple, tree.decode_table(bits, multi=True)))
+        else:
+            multi = single
+        
+        for name, value in (('lengths', types.MappingProxyType(lengths)),
+                            ('encode_table', types.MappingProxyType(encode_table)),
+                            ('_tree', tree), ('bits', bits),
+                            ('single', single), ('multi', multi)):
+            object.__setattr__(self, name, value)
+    
+    def __setattr__(self, name, value):
+        raise AttributeError(f"Codebook неизменяем: нельзя присвоить {name}")
+    
+    def __delattr__(self, name):
+        raise AttributeError(f"Codebook неизменяем: нельзя удалить {name}")
+    
+    def __reduce__(self):
+        return Codebook, (dict(self.lengths), self.multi is not self.single)
+    
+    def __eq__(self, other):
+        return (isinstance(other, Codebook)
+                and list(self.lengths.items()) == list(other.lengths.items()))
+    
+    def __hash__(self):
+        return hash(tuple(self.lengths.items()))
+    
+    def __repr__(self):
+        return f"Codebook({len(self.lengths)} символов, до {max(self.lengths.values(), default=0)} бит)"
+    
+    def encode(self, symbols):
+        """Кодирование символов в байты (последний байт дополнен нулями)"""
+        table = self.encode_table
+        buffer = io.BytesIO()
+        writer = BitWriter(buffer)
+        write_bits = writer.write_bits
+        for char in symbols:
+            write_bits(*table[char])
+        writer.flush()
+        return buffer.getvalue()
+    
+    def encoded_bits(self, freq):
+        """Размер в битах символов с частотами freq"""
+        table = self.encode_table
+        return sum(count * table[char][1] for char, count in freq.items())
+    
+    def decode_with_table(self, reader, length, multi=True):
+        """Табличное декодирование length символов из BitReader
+
+        С multi=True элементы результата - фрагменты из нескольких символов.
+        """
+        if not self.bits:
+            return [self.single[0][0]] * length if length else []
+        return _decode_with_tables(reader, length, self._tree, self.bits, self.single,
+                                   self.multi if multi else self.single)
+    
+    def decode(self, data, length):
+        """Декодирование length символов из байтов encode в строку"""
+        return ''.join(self.decode_with_table(BitReader(data), length))
+
+
+class ContextCoder:
+    """Контекстная модель: общая таблица и таблица на каждый предыдущий символ
+
+    При order=0 остаётся только общая таблица. Контекст получает
+    собственную таблицу, только если она окупает своё место в заголовке,
+    остальные (редкие) контексты кодируются общей таблицей.
+
+    Сам энтропийный кодер (бэкенд) задаёт подкласс: таблица по частотам,
+    её цена, кодирование и декодирование блока. Гистограмма, алфавит,
+    выбор контекстов, подпотоки и запись таблиц в заголовок общие.
+    Таблица описывается словарём {символ: целое}, который и хранится
+    в заголовке (длины кодов, нормированные частоты); по нему же
+    оценивается цена контекста, до построения самой таблицы.
+
+    Модель, построенная по выборке (escape=True), содержит в каждой
+    таблице символ ESCAPE: символ, которого нет в контекстной таблице,
+    кодируется как ESC и затем общей таблицей, а которого нет и в
+    общей - как ESC общей таблицы и литерал.
+    """
+    # Имя бэкенда в CLI и его номер в заголовке архива
+    name = None
+    backend_id = None
+    
+    def __init__(self, order=1):
+        self.order = order
+        self.alphabet = []
+        self.shared = None
+        self.contexts = {}
+        self.escape = False
+    
+    def _ordered(self, values):
+        """Словарь values с ключами в порядке алфавита модели"""
+        index = {char: i for i, char in enumerate(self.alphabet)}
+        return {char: values[char] for char in sorted(values, key=index.__getitem__)}
+    
+    def _tables(self):
+        """Пары (контекст, таблица); None - общая таблица"""
+        if self.shared is None:
+            return []
+        return [(None, self.shared)] + list(self.contexts.items())
+    
+    # Методы бэкенда
+    
+    def _values(self, freq):
+        """Описание таблицы {символ: целое} по частотам {символ: число}"""
+        raise NotImplementedError
+    
+    def _from_values(self, values):
+        """Таблица по описанию"""
+        raise NotImplementedError
+    
+    def _table_values(self, table):
+        """Описание готовой таблицы (для записи в заголовок)"""
+        raise NotImplementedError
+    
+    def _values_bits(self, values, freq):
+        """Размер символов freq, закодированных таблицей values, в битах"""
+        raise NotImplementedError
+    
+    def _values_size(self, values):
+        """Приблизительная цена описания таблицы в заголовке, в битах"""
+        raise NotImplementedError
+    
+    def _entry_bits(self, entry):
+        """Число бит на символ по элементу таблицы encode_tables"""
+        raise NotImplementedError
+    
+    def encode_tables(self):
+        """Таблицы кодирования {контекст: {символ: элемент}}"""
+        raise NotImplementedError
+    
+    def encode_block(self, symbols, tables=None):
+        """Кодирование блока символов в байты (контекст начинается заново)"""
+        raise NotImplementedError
+    
+    def decode_with_table(self, reader, length, multi=True):
+        """Табличное декодирование length символов"""
+        raise NotImplementedError
+    
+    # Общая часть
+    
+    def build_codes(self, text, stride=1, escape=False):
+        """Построение общей и контекстных таблиц кодов
+
+        stride - расстояние до символа-контекста: при кодировании
+        подпотоками (encode_interleaved) контекстом служит символ
+        предыдущей позиции того же подпотока, т.е. stride символов назад.
+        escape=True - text лишь выборка, таблицы получают символ ESCAPE.
+        """
+        from collections import Counter
+        
+        freq = Counter(text)
+        pairs = Counter(zip(text, text[stride:])) if self.order else None
+        self.build_from_counts(freq, pairs, escape)
+        return freq
+    
+    def build_from_counts(self, freq, pairs=None, escape=False):
+        """Построение таблиц по частотам символов и пар (контекст, символ)"""
+        freq = dict(freq)
+        if escape:
+            freq[ESCAPE] = _escape_count(freq)
+        self.escape = escape
+        self.alphabet = list(freq)
+        shared = self._values(freq)
+        self.shared = self._from_values(shared)
+        self.contexts = {}
+        
+        if self.order == 0:
+            return
+        
+        # Частоты символов после каждого предыдущего символа
+        followers = {}
+        for (prev, char), count in pairs.items():
+            followers.setdefault(prev, {})[char] = count
+        
+        for prev, context_freq in followers.items():
+            if escape:
+                context_freq[ESCAPE] = _escape_count(context_freq)
+            values = self._values(context_freq)
+            own_bits = self._values_bits(values, context_freq) + self._values_size(values)
+            if own_bits < self._values_bits(shared, context_freq):
+                self.contexts[prev] = self._from_values(values)
+    
+    def _escape_steps(self, tables, table, char):
+        """Шаги кодирования символа, которого нет в таблице table
+
+        Элементы таблиц encode_tables в порядке декодирования; int в
+        конце - литерал (код символа).
+        """
+        shared = tables[None]
+        steps = [table[ESCAPE]]
+        if table is not shared:
+            entry = shared.get(char)
+            if entry is not None:
+                steps.append(entry)
+                return steps
+            steps.append(shared[ESCAPE])
+        steps.append(ord(char))
+        return steps
+    
+    def histogram_bits(self, freq, pairs=None, tables=None):
+        """Размер данных в битах по частотам символов (или пар при order=1)
+
+        Начала блоков и подпотоков, кодируемые общей таблицей, не учитываются.
+        """
+        if tables is None:
+            tables = self.encode_tables()
+        entry_bits = self._entry_bits
+        shared = tables[None]
+        
+        def bits(table, char):
+            entry = table.get(char)
+            if entry is not None:
+                return entry_bits(entry)
+            steps = self._escape_steps(tables, table, char)
+            literal = LITERAL_BITS if isinstance(steps[-1], int) else 0
+            return literal + sum(entry_bits(step) for step in steps if not isinstance(step, int))
+        
+        if self.contexts and pairs is not None:
+            return sum(count * bits(tables.get(prev, shared), char)
+                       for (prev, char), count in pairs.items())
+        return sum(count * bits(shared, char) for char, count in freq.items())
+    
+    def encoded_bits(self, symbols, tables, stride=1):
+        """Размер блока в битах без кодирования (по гистограмме)"""
+        from collections import Counter
+        
+        if not self.contexts:
+            return self.histogram_bits(Counter(symbols), tables=tables)
+        return (self.histogram_bits(Counter(symbols[:stride]), tables=tables)
+                + self.histogram_bits(None, Counter(zip(symbols, symbols[stride:])), tables))
+    
+    def decode_block(self, data, length):
+        """Декодирование блока из length символов в текст"""
+        return ''.join(self.decode_with_table(BitReader(data), length))
+    
+    def encode_interleaved(self, symbols, streams, tables=None):
+        """Кодирование символов, разложенных по кругу в streams подпотоков
+
+        Символ i попадает в подпоток i % streams; подпотоки кодируются
+        независимо (контекст - предыдущий символ того же подпотока).
+        Формат: число подпотоков, размеры всех подпотоков, кроме
+        последнего, затем сами подпотоки.
+        """
+        if tables is None:
+            tables = self.encode_tables()
+        parts = [self.encode_block(symbols[i::streams], tables) for i in range(streams)]
+        
+        buffer = io.BytesIO()
+        buffer.write(bytes([streams]))
+        for part in parts[:-1]:
+            write_varint(buffer, len(part))
+        for part in parts:
+            buffer.write(part)
+        return buffer.getvalue()
+    
+    def decode_interleaved(self, data, length, executor=None):
+        """Декодирование блока encode_interleaved в текст
+
+        Подпотоки не зависят друг от друга, поэтому при переданном
+        executor декодируются параллельно.
+        """
+        f = io.BytesIO(data)
+        streams = f.read(1)[0]
+        sizes = [read_varint(f) for _ in range(streams - 1)]
+        parts = []
+        pos = f.tell()
+        for size in sizes:
+            parts.append(data[pos:pos + size])
+            pos += size
+        parts.append(data[pos:])
+        counts = [len(range(i, length, streams)) for i in range(streams)]
+        
+        def decode(part, count):
+            return self.decode_with_table(BitReader(part), count, multi=False)
+        
+        if executor is not None:
+            decoded = list(executor.map(decode, parts, counts))
+        else:
+            decoded = list(map(decode, parts, counts))
+        
+        result = [None] * length
+        for i, symbols in enumerate(decoded):
+            result[i::streams] = symbols
+        return ''.join(result)
+    
+    def write_tables(self, f):
+        """Запись алфавита и таблиц в заголовок"""
+        index = {char: i for i, char in enumerate(self.alphabet)}
+        
+        write_varint(f, len(self.alphabet))
+        for char in self.alphabet:
+            data = char.encode('utf-8')
+            write_varint(f, len(data))
+            f.write(data)
+        
+        _write_sparse(f, self._table_values(self.shared) if self.shared else {}, index)
+        
+        write_varint(f, len(self.contexts))
+        for prev, table in self.contexts.items():
+            write_varint(f, index[prev])
+            _write_sparse(f, self._table_values(table), index)
+    
+    @classmethod
+    def read_tables(cls, f, order):
+        """Чтение алфавита и таблиц, записанных write_tables"""
+        model = cls(order)
+        
+        count = read_varint(f)
+        model.alphabet = [f.read(read_varint(f)).decode('utf-8') for _ in range(count)]
+        
+        model.escape = ESCAPE in model.alphabet
+        values = _read_sparse(f, model.alphabet)
+        # Пустая таблица - все блоки хранятся без энтропийного кодирования
+        model.shared = model._from_values(values) if values else None
+        
+        for _ in range(read_varint(f)):
+            prev = model.alphabet[read_varint(f)]
+            model.contexts[prev] = model._from_values(_read_sparse(f, model.alphabet))
+        
+        return model
+
+
+class ContextHuffmanCoder(ContextCoder):
+    """Контекстная модель с кодами Хаффмана
+
+    Таблицы - неизменяемые Codebook с каноническими кодами, поэтому
+    в заголовке хранятся лишь длины кодов, а модель можно декодировать
+    из нескольких потоков. Таблица из одного символа кодирует его нулём бит.
+    """
+    name = 'huffman'
+    backend_id = 0
+    
+    def _values(self, freq):
+        return {char: len(code) for char, code in HuffmanTree.from_freq(freq).codes().items()}
+    
+    def _from_values(self, lengths):
+        """Кодовая книга; равные длины упорядочены по алфавиту модели
+
+        Многосимвольная таблица нужна только без контекстов.
+        """
+        return Codebook(self._ordered(lengths), multi=self.order == 0)
+    
+    def _table_values(self, codebook):
+        return dict(codebook.lengths)
     
-    print("Сжатие...", flush=True)
+    def _values_bits(self, lengths, freq):
+        if len(lengths) == 1:
+            return 0
+        return sum(count * lengths[char] for char, count in freq.items())
     
-    with open(output_path, 'wb') as f:
-        # Сохраняем длину текста
-        f.write(len(text).to_bytes(4, 'big'))
+    def _values_size(self, lengths):
+        # ~2 байта на символ
+        return 16 * (len(lengths) + 1)
+    
+    def _entry_bits(self, entry):
+        return entry[1]
+    
+    def encode_tables(self):
+        """Таблицы {контекст: {символ: (код, число бит)}}, None - общая таблица"""
+        return {prev: codebook.encode_table for prev, codebook in self._tables()}
+    
+    def encode_block(self, symbols, tables=None):
+        """Кодирование блока символов в байты (контекст начинается заново)"""
+        if tables is None:
+            tables = self.encode_tables()
+        shared = tables[None]
+        
+        buffer = io.BytesIO()
+        writer = BitWriter(buffer)
+        write_bits = writer.write_bits
+        prev = None
+        for char in symbols:
+            table = tables.get(prev, shared)
+            try:
+                write_bits(*table[char])
+            except KeyError:
+                for step in self._escape_steps(tables, table, char):
+                    if isinstance(step, int):
+                        write_bits(step, LITERAL_BITS)
+                    else:
+                        write_bits(*step)
+            prev = char
+        writer.flush()
+        return buffer.getvalue()
+    
+    def decode_with_tree(self, reader, length):
+        """Декодирование с переключением дерева по предыдущему символу"""
+        trees = {}
+        for prev, codebook in self._tables():
+            tree = codebook._tree
+            trees[prev] = (tree.symbols, tree.symbol, tree.left, tree.right, tree.root)
+        shared = trees[None]
+        
+        result = []
+        read_bit = reader.read_bit
+        prev = None
+        for _ in range(length):
+            symbols, symbol, left, right, node = trees.get(prev, shared)
+            while symbol[node] < 0:
+                node = right[node] if read_bit() else left[node]
+            prev = symbols[symbol[node]]
+            result.append(prev)
+        
+        return result
+    
+    def decode_with_table(self, reader, length, multi=True):
+        """Табличное декодирование с переключением таблицы по предыдущему символу
+
+        Без контекстов (order=0) и с multi=True элементы результата -
+        фрагменты из нескольких символов.
+        """
+        if not self.contexts and not self.escape:
+            return self.shared.decode_with_table(reader, length, multi)
+        
+        tables = {prev: (codebook.bits,) + codebook.single + (codebook._tree,)
+                  for prev, codebook in self._tables()}
+        shared = tables[None]
+        
+        result = []
+        peek_bits = reader.peek_bits
+        skip_bits = reader.skip_bits
+        read_bit = reader.read_bit
+        
+        def decode_shared():
+            """Символ после ESC контекстной таблицы"""
+            bits, out, counts, lengths, nodes, tree = shared
+            value = peek_bits(bits)
+            skip_bits(lengths[value])
+            if counts[value]:
+                return out[value]
+            node = nodes[value]
+            while tree.symbol[node] < 0:
+                node = tree.right[node] if read_bit() else tree.left[node]
+            return tree.char(node)
+        
+        prev = None
+        for _ in range(length):
+            table = tables.get(prev, shared)
+            bits, out, counts, lengths, nodes, tree = table
+            value = peek_bits(bits)
+            skip_bits(lengths[value])
+            if counts[value]:
+                prev = out[value]
+            else:
+                node = nodes[value]
+                while tree.symbol[node] < 0:
+                    node = tree.right[node] if read_bit() else tree.left[node]
+                prev = tree.char(node)
+            if prev == ESCAPE:
+                if table is not shared:
+                    prev = decode_shared()
+                if prev == ESCAPE:
+                    prev = chr(peek_bits(LITERAL_BITS))
+                    skip_bits(LITERAL_BITS)
+            result.append(prev)
+        
+        return result
+
+
+def normalize_counts(freq, log):
+    """Нормирование частот к сумме 2**log, каждому символу - не меньше 1
+
+    Остаток от округления вниз достаётся символам с наибольшей
+    дробной частью; избыток (от поднятых до 1 редких символов)
+    снимается с самых частых. Символов не больше 2**log, иначе ValueError.
+    """
+    total = sum(freq.values())
+    size = 1 << log
+    if len(freq) > size:
+        raise ValueError(f"{len(freq)} символов не помещаются в таблицу из {size} ячеек")
+    counts = {char: max(1, count * size // total) for char, count in freq.items()}
+    
+    rest = size - sum(counts.values())
+    if rest > 0:
+        for char in heapq.nlargest(rest, freq, key=lambda char: freq[char] * size % total):
+            counts[char] += 1
+    elif rest < 0:
+        order = sorted(counts, key=counts.get, reverse=True)
+        i = 0
+        while rest < 0:
+            char = order[i % len(order)]
+            if counts[char] > 1:
+                counts[char] -= 1
+                rest += 1
+            i += 1
+    return counts
+
+
+class TansTable:
+    """Таблица tANS для одного распределения
+
+    counts - нормированные частоты {символ: n} с суммой L = 2**log
+    (по ней log и определяется). Состояние кодера лежит в [L, 2L): символ s отдаёт в поток младшие
+    биты состояния и переводит его в ячейку своего диапазона из n
+    ячеек. Декодер по ячейке (состояние - L) сразу получает символ,
+    число бит для дочитывания и базу следующего состояния.
+    """
+    __slots__ = ('counts', 'log', 'symbols', 'nbits', 'base', 'encode')
+    
+    def __init__(self, counts):
+        size = sum(counts.values())
+        if size < 2 or size & (size - 1):
+            raise ArchiveError(f"Сумма частот таблицы tANS не степень двойки: {size}")
+        log = size.bit_length() - 1
+        self.counts = counts
+        self.log = log
         
-        # Сохраняем таблицу частот
-        freq_data = pickle.dumps(freq)
-        f.write(len(freq_data).to_bytes(4, 'big'))
-        f.write(freq_data)
+        # Символы разбрасываются по ячейкам шагом, взаимно простым с L (как в FSE)
+        spread = [None] * size
+        step = (size >> 1) + (size >> 3) + 3
+        pos = 0
+        for char, count in counts.items():
+            for _ in range(count):
+                spread[pos] = char
+                pos = (pos + step) & (size - 1)
         
-        # Кодируем текст
-        writer = BitWriter(f)
+        self.symbols = spread
+        self.nbits = array('B', bytes(size))
+        self.base = array('i', [0]) * size
+        next_state = dict(counts)
+        slots = {char: [0] * count for char, count in counts.items()}
+        for cell, char in enumerate(spread):
+            state = next_state[char]
+            next_state[char] = state + 1
+            bits = log + 1 - state.bit_length()
+            self.nbits[cell] = bits
+            self.base[cell] = (state << bits) - size
+            slots[char][state - counts[char]] = size + cell
         
-        for i, char in enumerate(text):
-            code = coder.codes[char]
-            for bit in code:
-                writer.write_bit(int(bit))
+        # Символ -> (n, наибольшее число бит, состояния кодера по x - n)
+        self.encode = {
+            char: (count, log + 1 - count.bit_length(), slots[char])
+            for char, count in counts.items()
+        }
+
+
+class ContextTansCoder(ContextCoder):
+    """Контекстная модель с табличной асимметричной системой счисления (tANS)
+
+    Символ с нормированной частотой n стоит ~log2(L/n) бит, т.е.
+    дробное число, и на перекошенных распределениях tANS сжимает
+    лучше Хаффмана. Все таблицы модели одного размера L, поэтому
+    состояние свободно переходит между таблицами контекстов.
+    Кодирование идёт с конца блока, а декодер начинает с последнего
+    состояния кодера, записанного в начале блока (log бит).
+    """
+    name = 'tans'
+    backend_id = 1
+    
+    def __init__(self, order=1):
+        super().__init__(order)
+        # log2 размера таблиц; в заголовке не хранится - это log2 суммы
+        # нормированных частот любой таблицы
+        self.log = TANS_LOG
+    
+    def build_from_counts(self, freq, pairs=None, escape=False):
+        """Построение таблиц; размер таблиц выбирается по общей гистограмме
+
+        Берётся log из TANS_LOG..TANS_MAX_LOG с наименьшей оценкой
+        данных плюс общей таблицы в заголовке: на больших файлах
+        точность частот окупает более длинные varint в заголовке.
+        Не меньше восьми ячеек на символ, иначе у редких символов
+        большого алфавита (иероглифы, слова) частоты слишком грубы;
+        для таких алфавитов пределы сдвигаются вверх.
+        """
+        if freq:
+            sized = dict(freq)
+            if escape:
+                sized[ESCAPE] = _escape_count(sized)
+            
+            def cost(log):
+                counts = normalize_counts(sized, log)
+                return (sum(count * (log - math.log2(counts[char])) for char, count in sized.items())
+                        + self._values_size(counts))
             
-            if (i + 1) % 100 == 0 or i + 1 == len(text):
-                print(f"\r{i + 1}/{len(text)} ({(i+1)*100//len(text)}%)", end='', flush=True)
+            low = max(TANS_LOG, len(sized).bit_length() + 3)
+            self.log = min(range(low, max(TANS_MAX_LOG, low + 1) + 1), key=cost)
+        super().build_from_counts(freq, pairs, escape)
+    
+    @classmethod
+    def read_tables(cls, f, order):
+        model = super().read_tables(f, order)
+        if model.shared is not None:
+            model.log = model.shared.log
+            if any(table.log != model.log for table in model.contexts.values()):
+                raise ArchiveError("Таблицы tANS разного размера")
+        return model
+    
+    def _values(self, freq):
+        return normalize_counts(freq, self.log)
+    
+    def _from_values(self, counts):
+        return TansTable(self._ordered(counts))
+    
+    def _table_values(self, table):
+        return table.counts
+    
+    def _values_bits(self, counts, freq):
+        log = self.log
+        return sum(count * (log - math.log2(counts[char])) for char, count in freq.items())
+    
+    def _values_size(self, counts):
+        # Приращение индекса и частота (varint) на символ
+        return 8 * (1 + sum(1 + (count.bit_length() + 6) // 7 for count in counts.values()))
+    
+    def _entry_bits(self, entry):
+        return self.log - math.log2(entry[0])
+    
+    def encode_tables(self):
+        """Таблицы {контекст: {символ: (n, число бит, состояния)}}"""
+        return {prev: table.encode for prev, table in self._tables()}
+    
+    def encode_block(self, symbols, tables=None):
+        """Кодирование блока символов в байты (с конца блока)"""
+        if tables is None:
+            tables = self.encode_tables()
+        shared = tables[None]
+        log = self.log
+        
+        chunks = []
+        append = chunks.append
+        state = 1 << log
+        for i in range(len(symbols) - 1, -1, -1):
+            table = tables.get(symbols[i - 1], shared) if i else shared
+            entry = table.get(symbols[i])
+            if entry is None:
+                # ESC: шаги кодируются в обратном порядке, как и весь блок
+                steps = self._escape_steps(tables, table, symbols[i])
+                if isinstance(steps[-1], int):
+                    append((steps.pop(), LITERAL_BITS))
+                for count, bits, slots in reversed(steps):
+                    if state >> bits < count:
+                        bits -= 1
+                    append((state & ((1 << bits) - 1), bits))
+                    state = slots[(state >> bits) - count]
+                continue
+            count, bits, slots = entry
+            if state >> bits < count:
+                bits -= 1
+            append((state & ((1 << bits) - 1), bits))
+            state = slots[(state >> bits) - count]
         
+        buffer = io.BytesIO()
+        writer = BitWriter(buffer)
+        write_bits = writer.write_bits
+        write_bits(state - (1 << log), log)
+        for value, bits in reversed(chunks):
+            write_bits(value, bits)
         writer.flush()
+        return buffer.getvalue()
+    
+    def decode_with_table(self, reader, length, multi=True):
+        """Табличное декодирование с переключением таблицы по предыдущему символу
+
+        multi не используется: за шаг декодируется один символ.
+        """
+        tables = {prev: (table.symbols, table.nbits, table.base) for prev, table in self._tables()}
+        shared = tables[None]
+        switch = bool(self.contexts)
+        
+        peek_bits = reader.peek_bits
+        skip_bits = reader.skip_bits
+        state = peek_bits(self.log)
+        skip_bits(self.log)
+        
+        result = []
+        symbols, nbits, base = shared
+        for _ in range(length):
+            char = symbols[state]
+            bits = nbits[state]
+            state = base[state] + peek_bits(bits)
+            skip_bits(bits)
+            if char == ESCAPE:
+                if symbols is not shared[0]:
+                    char = shared[0][state]
+                    bits = shared[1][state]
+                    state = shared[2][state] + peek_bits(bits)
+                    skip_bits(bits)
+                if char == ESCAPE:
+                    char = chr(peek_bits(LITERAL_BITS))
+                    skip_bits(LITERAL_BITS)
+            result.append(char)
+            if switch:
+                symbols, nbits, base = tables.get(char, shared)
+        
+        return result
+
+
+# Бэкенды энтропийного кодирования по имени
+BACKENDS = {cls.name: cls for cls in (ContextHuffmanCoder, ContextTansCoder)}
+
+
+def write_varint(f, value):
+    """Запись неотрицательного целого (LEB128)"""
+    while value >= 0x80:
+        f.write(bytes([(value & 0x7f) | 0x80]))
+        value >>= 7
+    f.write(bytes([value]))
+
+
+def read_varint(f):
+    """Чтение целого, записанного write_varint"""
+    value = 0
+    shift = 0
+    while True:
+        byte = f.read(1)
+        if not byte:
+            raise ArchiveError('Неожиданный конец файла')
+        value |= (byte[0] & 0x7f) << shift
+        if byte[0] < 0x80:
+            return value
+        shift += 7
+
+
+def _write_sparse(f, values, index):
+    """Разреженная таблица: (приращение индекса символа, значение)"""
+    write_varint(f, len(values))
+    last = -1
+    for i, char in sorted((index[char], char) for char in values):
+        write_varint(f, i - last - 1)
+        write_varint(f, values[char])
+        last = i
+
+
+def _read_sparse(f, alphabet):
+    values = {}
+    last = -1
+    for _ in range(read_varint(f)):
+        last += read_varint(f) + 1
+        if last >= len(alphabet):
+            raise ArchiveError("Таблица ссылается на символ вне алфавита")
+        values[alphabet[last]] = read_varint(f)
+    return values
+
+_word_re = None
+
+def _words(text):
+    """Разбиение текста на слова и отдельные прочие символы"""
+    global _word_re
+    if _word_re is None:
+        import re
+        _word_re = re.compile(r'\w+|\W')
+    return _word_re.findall(text)
+
+def merge_symbols(text, mode, limit=MERGE_LIMIT):
+    """Подбор многосимвольных единиц алфавита
+
+    mode='words' - частые слова целиком, mode='digrams' - частые пары
+    символов. Единицы упорядочены по выгоде: (длина - 1) * число вхождений.
+    """
+    from collections import Counter
+    
+    if mode == 'words':
+        counts = Counter(word for word in _words(text) if len(word) > 1)
+    elif mode == 'digrams':
+        counts = Counter(map(str.__add__, text, text[1:]))
+    else:
+        raise ValueError(f"Неизвестный режим алфавита: {mode}")
+    
+    # Единица окупается, если сэкономленные символы (~полбайта каждый)
+    # перекрывают её запись в алфавите заголовка
+    candidates = [
+        (count * (len(unit) - 1), unit) for unit, count in counts.items()
+        if count * (len(unit) - 1) > 2 * (len(unit.encode('utf-8')) + 3)
+    ]
+    return {unit for _, unit in heapq.nlargest(limit, candidates)}
+
+
+def split_symbols(text, units, mode):
+    """Разбиение текста на символы алфавита, расширенного единицами units"""
+    symbols = []
+    if mode == 'words':
+        for word in _words(text):
+            if word in units:
+                symbols.append(word)
+            else:
+                symbols.extend(word)
+    else:
+        i = 0
+        while i < len(text):
+            pair = text[i:i + 2]
+            if pair in units:
+                symbols.append(pair)
+                i += 2
+            else:
+                symbols.append(text[i])
+                i += 1
+    return symbols
+
+
+
+def log(*args, **kwargs):
+    """Диагностика - всегда в stderr: stdout может быть занят данными"""
+    print(*args, file=sys.stderr, flush=True, **kwargs)
+
+class _StdStream:
+    """Стандартный поток в with: при выходе сбрасывается, но не закрывается"""
+    
+    def __init__(self, stream):
+        self.stream = stream
+    
+    def __enter__(self):
+        return self.stream
+    
+    def __exit__(self, *exc_info):
+        self.stream.flush()
+
+def open_stream(path, mode):
+    """Открытие файла в двоичном режиме; '-' - stdin/stdout"""
+    if path == '-':
+        return _StdStream(sys.stdin.buffer if 'r' in mode else sys.stdout.buffer)
+    return open(path, mode)
+
+class _CountingWriter:
+    """Обёртка над выходным потоком, считающая записанные байты
+
+    Заменяет tell(), которого нет у каналов (stdout в конвейере).
+    """
+    
+    def __init__(self, file):
+        self.file = file
+        self.pos = 0
+    
+    def write(self, data):
+        self.pos += len(data)
+        return self.file.write(data)
     
-    print()
+    def tell(self):
+        return self.pos
+
+def estimate_entropy(freq):
+    """Энтропия нулевого порядка (бит на символ) по таблице частот"""
+    total = sum(freq.values())
+    if not total:
+        return 0.0
+    return -sum(count * math.log2(count / total) for count in freq.values()) / total
+
+def _escape_count(freq):
+    """Частота ESC: сколько символов встретилось ровно один раз
+
+    Оценка Гуда-Тьюринга для доли ещё не встреченных символов.
+    """
+    return max(1, sum(1 for count in freq.values() if count == 1))
+
+def _worth_coding(freq, raw_size, header=True):
+    """Окупится ли энтропийное кодирование при данной гистограмме
+
+    Оценка снизу: энтропийный размер данных плюс алфавит и длины кодов
+    в заголовке. Если даже она не меньше исходного размера в UTF-8,
+    файл сохраняется как есть, без построения таблиц. header=False -
+    без заголовка (гистограмма выборки: заголовок окупается всем файлом).
+    """
+    payload = estimate_entropy(freq) * sum(freq.values()) / 8
+    if header:
+        payload += sum(len(char.encode('utf-8')) + 3 for char in freq)
+    return payload < raw_size
+
+def _choose_method(model, tables, block, raw_size, stride=1):
+    """Выбор способа хранения блока: RLE, энтропийное кодирование или без сжатия"""
+    if len(set(block)) == 1:
+        return METHOD_RLE
+    if not model.alphabet:
+        return METHOD_STORED
+    if (model.encoded_bits(block, tables, stride) + 7) // 8 >= raw_size:
+        return METHOD_STORED
+    return METHOD_ENTROPY
+
+def _write_header(f, model):
+    """Заголовок: MAGIC, версия, порядок, бэкенд, таблицы и CRC32"""
+    tables_data = io.BytesIO()
+    model.write_tables(tables_data)
+    header = io.BytesIO()
+    header.write(MAGIC)
+    header.write(bytes([FORMAT_VERSION, model.order, model.backend_id]))
+    write_varint(header, len(tables_data.getvalue()))
+    header.write(tables_data.getvalue())
+    f.write(header.getvalue())
+    f.write(zlib.crc32(header.getvalue()).to_bytes(4, 'big'))
+
+def _write_block(f, model, tables, block, streams):
+    """Запись блока символов, возвращает способ хранения"""
+    raw = ''.join(block).encode('utf-8')
+    
+    method = _choose_method(model, tables, block, len(raw), streams)
+    if method == METHOD_ENTROPY and streams > 1:
+        payload = model.encode_interleaved(block, streams, tables)
+        method = METHOD_INTERLEAVED
+        if len(payload) >= len(raw):
+            method, payload = METHOD_STORED, raw
+    elif method == METHOD_ENTROPY:
+        payload = model.encode_block(block, tables)
+    elif method == METHOD_RLE:
+        payload = block[0].encode('utf-8')
+    else:
+        payload = raw
     
-    original = Path(input_path).stat().st_size
-    compressed = Path(output_path).stat().st_size
+    block_header = io.BytesIO()
+    write_varint(block_header, len(block))
+    block_header.write(bytes([method]))
+    write_varint(block_header, len(payload))
+    block_header = block_header.getvalue()
+    
+    data_crc = zlib.crc32(raw).to_bytes(4, 'big')
+    
+    f.write(block_header)
+    f.write(zlib.crc32(payload, zlib.crc32(data_crc, zlib.crc32(block_header))).to_bytes(4, 'big'))
+    f.write(data_crc)
+    f.write(payload)
+    return method
+
+def _write_index(f, offsets):
+    """Маркер конца блоков, индекс смещений с CRC32 и смещение индекса"""
+    write_varint(f, 0)
+    index_offset = f.tell()
+    index = io.BytesIO()
+    write_varint(index, len(offsets))
+    for offset in offsets:
+        write_varint(index, offset)
+    f.write(index.getvalue())
+    f.write(zlib.crc32(index.getvalue()).to_bytes(4, 'big'))
+    f.write(index_offset.to_bytes(8, 'big'))
+
+def _log_summary(original, compressed, backend, model, methods):
+    """Итог сжатия в stderr"""
     ratio = (1 - compressed / original) * 100 if original > 0 else 0
     
-    print(f"\n✓ Готово!")
-    print(f"  Исходный: {original} байт")
-    print(f"  Сжатый: {compressed} байт")
-    print(f"  Сжатие: {ratio:.1f}%")
+    log(f"\n✓ Готово!")
+    log(f"  Исходный: {original} байт")
+    log(f"  Сжатый: {compressed} байт")
+    log(f"  Сжатие: {ratio:.1f}%")
+    log(f"  Бэкенд: {backend}")
+    log(f"  Блоков: {sum(methods.values())} (" + ", ".join(
+        f"{METHOD_NAMES[method]}: {count}" for method, count in sorted(methods.items())) + ")")
+    if model.order:
+        log(f"  Контекстных таблиц: {len(model.contexts)}")
 
-def decompress_file(input_path, output_path):
-    """Распаковка файла"""
-    print(f"Чтение {input_path}...", flush=True)
-    with open(input_path, 'rb') as f:
-        # Читаем длину текста
-        length = int.from_bytes(f.read(4), 'big')
+def compress_file(input_path, output_path, order=0, merge=None, streams=1, backend='huffman',
+                  sample=None):
+    """Сжатие файла
+
+    order=0 - одна таблица кодов, order=1 - таблица на каждый
+    предыдущий символ (с общей таблицей для редких контекстов).
+    merge='words' или 'digrams' расширяет алфавит частыми словами
+    или парами символов. streams > 1 раскладывает символы блока по
+    кругу в независимые подпотоки для параллельного декодирования.
+    backend - энтропийный кодер из BACKENDS ('huffman' или 'tans'),
+    его номер записывается в заголовок. sample - размер выборки
+    в байтах: таблицы строятся по ней, а файл сжимается за один
+    проход (см. _compress_sampled).
+
+    Формат: заголовок (бэкенд, алфавит и таблицы) с CRC32, блоки по
+    BLOCK_SIZE символов с CRC32 сжатых и исходных данных, нулевой
+    маркер конца, индекс смещений блоков с CRC32 и 8 байт смещения индекса.
+    """
+    from collections import Counter
+    
+    if backend not in BACKENDS:
+        raise ValueError(f"Неизвестный бэкенд: {backend}")
+    if order not in (0, 1):
+        raise ValueError(f"Порядок модели должен быть 0 или 1: {order}")
+    if merge is not None and merge not in ('words', 'digrams'):
+        raise ValueError(f"Неизвестный режим алфавита: {merge}")
+    if not 1 <= streams <= 255:
+        raise ValueError(f"Число подпотоков должно быть от 1 до 255: {streams}")
+    if sample:
+        return _compress_sampled(input_path, output_path, sample, order, merge, streams, backend)
+    
+    log(f"Чтение {input_path}...")
+    with open_stream(input_path, 'rb') as f:
+        data = f.read()
+    text = data.decode('utf-8')
+    
+    log(f"Размер: {len(text)} символов")
+    
+    symbols = text
+    model = BACKENDS[backend](order)
+    
+    if not text:
+        # Пустой вход (например, в конвейере) - архив без блоков
+        log("Файл пустой!")
+    elif not _worth_coding(Counter(text), len(data)):
+        # Несжимаемые данные: таблицы не строим, блоки хранятся как есть
+        log("Данные несжимаемы, сохранение без сжатия...")
+    else:
+        if merge:
+            log(f"Расширение алфавита ({merge})...")
+            symbols = split_symbols(text, merge_symbols(text, merge), merge)
         
-        # Читаем таблицу частот
-        freq_len = int.from_bytes(f.read(4), 'big')
-        freq_data = f.read(freq_len)
-        freq = pickle.loads(freq_data)
+        log(f"Построение таблиц кодов ({backend}, порядок {order})...")
         
-        # Остальное - закодированные данные
-        encoded_data = f.read()
+        # Создаём кодировщик
+        model.build_codes(symbols, stride=streams)
+    tables = model.encode_tables()
     
-    print(f"Распаковка {length} символов...", flush=True)
-    print("Восстановление дерева...", flush=True)
+    log("Сжатие...")
+    
+    with open_stream(output_path, 'wb') as out:
+        f = _CountingWriter(out)
+        _write_header(f, model)
+        
+        # Блоки
+        offsets = []
+        methods = Counter()
+        total = len(symbols)
+        for start in range(0, total, BLOCK_SIZE):
+            offsets.append(f.tell())
+            methods[_write_block(f, model, tables, symbols[start:start + BLOCK_SIZE], streams)] += 1
+            
+            done = min(start + BLOCK_SIZE, total)
+            log(f"\r{done}/{total} ({done*100//total}%)", end='')
+        
+        _write_index(f, offsets)
+    
+    log()
+    _log_summary(len(data), f.tell(), backend, model, methods)
+    if merge:
+        log(f"  Алфавит: {len(model.alphabet)} единиц, {total} символов вместо {len(text)}")
+
+def read_sample(f, size, windows=SAMPLE_WINDOWS):
+    """Выборка для статистики: (текст выборки, прочитанное начало потока, вход целиком)
+
+    Из обычного файла больше size берутся windows окон, равномерно
+    разнесённых по файлу (через mmap), и поток не сдвигается. Из канала
+    или небольшого файла читаются первые size байт - они же потом
+    и сжимаются первыми. Если вход прочитан целиком, статистика точная.
+    """
+    import os
+    import stat
+    
+    try:
+        st = os.fstat(f.fileno())
+    except (AttributeError, OSError, io.UnsupportedOperation):
+        st = None
+    
+    regular = st is not None and stat.S_ISREG(st.st_mode)
+    if regular and st.st_size > size and windows > 1:
+        import mmap
+        
+        window = max(1, size // windows)
+        step = (st.st_size - window) // (windows - 1)
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            # Окно может начаться или закончиться посреди символа UTF-8 -
+            # обрезанные байты отбрасываются
+            parts = [data[i * step:i * step + window].decode('utf-8', errors='ignore')
+                     for i in range(windows)]
+        return ''.join(parts), b'', False
+    
+    head = f.read(size)
+    if len(head) < size or (regular and st.st_size <= size):
+        return head.decode('utf-8'), head, True
+    # Начало канала: последний символ мог оборваться
+    return head.decode('utf-8', errors='ignore'), head, False
+
+def read_text_chunks(f, head=b'', chunk_size=READ_CHUNK):
+    """Чтение текста порциями: пары (прочитано байт, текст)
+
+    Символ UTF-8 на границе порций не рвётся; head - уже прочитанное
+    начало потока. Последняя пара (0, хвост декодера).
+    """
+    import codecs
+    
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    data = head or f.read(chunk_size)
+    while data:
+        yield len(data), decoder.decode(data)
+        data = f.read(chunk_size)
+    yield 0, decoder.decode(b'', True)
+
+def _compress_sampled(input_path, output_path, sample, order=0, merge=None, streams=1,
+                     backend='huffman'):
+    """Однопроходное сжатие по статистике выборки
+
+    Таблицы (с символом ESCAPE для не попавших в выборку символов)
+    строятся по выборке из sample байт, затем вход читается по
+    READ_CHUNK байт и сжимается блоками, целиком в памяти не держится.
+    Если по оценке выборки данные вместе с таблицами заголовка не
+    меньше входа, блоки хранятся как есть. Попутно собирается точная
+    гистограмма, и в конце оценивается потеря сжатия относительно
+    двухпроходного режима.
+    """
+    import os
+    from collections import Counter
+    
+    log(f"Чтение выборки из {input_path}...")
+    with open_stream(input_path, 'rb') as f:
+        sample_text, head, complete = read_sample(f, sample)
+        
+        units = set()
+        sample_symbols = sample_text
+        model = BACKENDS[backend](order)
+        if not sample_text and not head:
+            # Пустой вход - архив без блоков
+            log("Файл пустой!")
+        # Если выборка - весь вход, заголовок окупается только ею
+        elif not _worth_coding(Counter(sample_text), len(sample_text.encode('utf-8')),
+                               header=complete):
+            log("Выборка несжимаема, сохранение без сжатия...")
+        else:
+            if merge:
+                log(f"Расширение алфавита ({merge})...")
+                units = merge_symbols(sample_text, merge)
+                sample_symbols = split_symbols(sample_text, units, merge)
+                # Единица, не попавшая в алфавит, была бы закодирована литералом
+                units &= set(sample_symbols)
+            
+            log(f"Построение таблиц кодов по выборке ({backend}, порядок {order})...")
+            # Вход прочитан целиком: статистика точная, ESC не нужен
+            sample_freq = model.build_codes(sample_symbols, stride=streams, escape=not complete)
+            
+            # Оценка всего входа (для канала - хотя бы прочитанного начала)
+            # по выборке, вместе с таблицами в заголовке
+            sample_size = len(sample_text.encode('utf-8'))
+            try:
+                total = os.fstat(f.fileno()).st_size
+            except (AttributeError, OSError, io.UnsupportedOperation):
+                total = 0
+            total = max(total, len(head), sample_size)
+            sample_pairs = (Counter(zip(sample_symbols, sample_symbols[streams:]))
+                            if order else None)
+            if _sampled_size(model, sample_freq, sample_pairs, sample_size, total) >= total:
+                log("Таблицы не окупаются, сохранение без сжатия...")
+                model = BACKENDS[backend](order)
+                units = set()
+        tables = model.encode_tables()
+        
+        log("Сжатие...")
+        
+        with open_stream(output_path, 'wb') as out:
+            out = _CountingWriter(out)
+            _write_header(out, model)
+            
+            offsets = []
+            methods = Counter()
+            # Точная статистика для оценки потерь
+            freq = Counter()
+            pairs = Counter()
+            # Символы до расширения алфавита - для решения двухпроходного режима
+            letters = Counter() if merge else freq
+            tail = [] if merge else ''
+            
+            pending = [] if merge else ''
+            original = 0
+            chars = 0
+            for size, text in read_text_chunks(f, head):
+                original += size
+                chars += len(text)
+                symbols = text
+                if merge:
+                    letters.update(text)
+                    symbols = split_symbols(text, units, merge)
+                
+                freq.update(symbols)
+                if order:
+                    joined = tail + symbols
+                    pairs.update(zip(joined, joined[streams:]))
+                    tail = joined[-streams:]
+                
+                pending += symbols
+                # Последняя порция (size == 0) дописывает неполный блок
+                while len(pending) >= BLOCK_SIZE or (not size and pending):
+                    block, pending = pending[:BLOCK_SIZE], pending[BLOCK_SIZE:]
+                    offsets.append(out.tell())
+                    methods[_write_block(out, model, tables, block, streams)] += 1
+                    log(f"\r{original} байт прочитано, блоков: {len(offsets)}", end='')
+            
+            _write_index(out, offsets)
+    
+    log()
+    _log_summary(original, out.tell(), backend, model, methods)
+    if merge:
+        log(f"  Алфавит: {len(model.alphabet)} единиц, {sum(freq.values())} символов вместо {chars}")
+    
+    # Оценка: те же данные так, как их сжал бы двухпроходный режим
+    # (несжимаемые - как есть, иначе с таблицами по статистике всего файла)
+    if freq:
+        if model.alphabet:
+            sampled_size = model.histogram_bits(freq, pairs, tables) / 8 + _tables_size(model)
+        else:
+            sampled_size = original
+        if _worth_coding(letters, original):
+            exact = BACKENDS[backend](order)
+            exact.build_from_counts(freq, pairs)
+            exact_size = exact.histogram_bits(freq, pairs) / 8 + _tables_size(exact)
+        else:
+            exact_size = original
+        loss = sampled_size - exact_size
+        log(f"  Выборка: {len(sample_text)} символов; потеря относительно точной "
+            f"статистики ~{loss:+.0f} байт ({loss * 100 / exact_size:+.2f}%)")
+
+def _sampled_size(model, freq, pairs, raw_size, total):
+    """Оценка сжатого размера входа из total байт по выборке из raw_size байт
+
+    Символы, встреченные в выборке один раз, по оценке Гуда-Тьюринга
+    замещают ещё не встреченные и считаются как ESC с литералом.
+    Таблицы в заголовке входят в оценку.
+    """
+    novel = {char for char, count in freq.items() if count == 1} if model.escape else set()
+    if novel:
+        freq = {char: count for char, count in freq.items() if char not in novel}
+        if pairs is not None:
+            pairs = {pair: count for pair, count in pairs.items() if pair[1] not in novel}
+    bits = model.histogram_bits(freq, pairs)
+    if novel:
+        bits += len(novel) * (model.histogram_bits({ESCAPE: 1}) + LITERAL_BITS)
+    return bits / 8 * total / raw_size + _tables_size(model)
+
+def _tables_size(model):
+    """Размер таблиц модели в заголовке, байт"""
+    buffer = io.BytesIO()
+    model.write_tables(buffer)
+    return len(buffer.getvalue())
+
+def _read_legacy(f):
+    """Чтение архива старого формата (длина + pickle таблицы частот)"""
+    import pickle
+    
+    # Читаем длину текста и таблицу частот
+    fields = f.read(8)
+    if len(fields) < 8:
+        raise ArchiveError("Архив пустой или обрезан")
+    length = int.from_bytes(fields[:4], 'big')
+    freq_len = int.from_bytes(fields[4:], 'big')
+    freq_data = f.read(freq_len)
+    if len(freq_data) < freq_len:
+        raise ArchiveError("Архив обрезан")
+    try:
+        freq = pickle.loads(freq_data)
+    except Exception as e:
+        raise ArchiveError(f"Не архив (таблица частот не читается: {e})") from e
+    if not isinstance(freq, dict):
+        raise ArchiveError("Не архив (таблица частот не словарь)")
     
     # Восстанавливаем дерево
     coder = HuffmanCoder()
     coder.tree = coder.build_tree(freq)
     coder._generate_codes(coder.tree)
+    return coder, length
+
+def _read_header(f):
+    """Чтение и проверка заголовка (после MAGIC), возвращает (модель, версия)"""
+    reader = CrcReader(f)
+    reader.crc = zlib.crc32(MAGIC)
+    fields = reader.read(2)
+    if len(fields) < 2:
+        raise ArchiveError("Архив обрезан")
+    version, order = fields
+    if version not in (2, 3, FORMAT_VERSION):
+        raise ArchiveError(f"Неподдерживаемая версия формата: {version}")
+    # В версии 2 бэкенда в заголовке нет - всегда Хаффман
+    backend = ContextHuffmanCoder.backend_id
+    if version >= 3:
+        field = reader.read(1)
+        if not field:
+            raise ArchiveError("Архив обрезан")
+        backend = field[0]
+    tables_data = reader.read(read_varint(reader))
+    if int.from_bytes(f.read(4), 'big') != reader.crc:
+        raise ArchiveError("Заголовок повреждён (CRC32)")
+    for cls in BACKENDS.values():
+        if cls.backend_id == backend:
+            return cls.read_tables(io.BytesIO(tables_data), order), version
+    raise ArchiveError(f"Неизвестный бэкенд: {backend}")
+
+def _read_block(f, version=FORMAT_VERSION):
+    """Чтение блока: (число символов, способ хранения, данные, CRC32 текста)
+
+    CRC32 сжатых данных покрывает и поля заголовка блока, а с версии 4
+    и CRC32 текста. Возвращает None на маркере конца блоков.
+    """
+    reader = CrcReader(f)
+    length = read_varint(reader)
+    if length == 0:
+        return None
+    method = reader.read(1)
+    if not method:
+        raise ArchiveError("Архив обрезан")
+    size = read_varint(reader)
+    payload_crc = f.read(4)
+    data_crc = (reader if version >= 4 else f).read(4)
+    payload = reader.read(size)
+    if len(payload_crc) < 4 or len(data_crc) < 4 or len(payload) < size:
+        raise ArchiveError("Архив обрезан")
+    payload_crc = int.from_bytes(payload_crc, 'big')
+    data_crc = int.from_bytes(data_crc, 'big')
+    if reader.crc != payload_crc:
+        raise ArchiveError("Сжатые данные блока повреждены (CRC32)")
+    if method[0] not in METHOD_NAMES:
+        raise ArchiveError(f"Неизвестный способ хранения блока: {method[0]}")
+    return length, method[0], payload, data_crc
+
+def _read_index(f):
+    """Чтение индекса смещений блоков (сразу за маркером конца) с проверкой CRC32"""
+    index = CrcReader(f)
+    offsets = [read_varint(index) for _ in range(read_varint(index))]
+    crc = f.read(4)
+    if len(crc) < 4:
+        raise ArchiveError("Архив обрезан")
+    if int.from_bytes(crc, 'big') != index.crc:
+        raise ArchiveError("Индекс повреждён (CRC32)")
+    return offsets
+
+def _decode_block(model, length, method, payload, data_crc, executor=None):
+    """Декодирование блока в байты UTF-8 с проверкой CRC32 результата"""
+    if method == METHOD_STORED:
+        data = payload
+    elif method == METHOD_RLE:
+        data = payload * length
+    elif method == METHOD_INTERLEAVED:
+        data = model.decode_interleaved(payload, length, executor).encode('utf-8')
+    else:
+        data = model.decode_block(payload, length).encode('utf-8')
+    if zlib.crc32(data) != data_crc:
+        raise ArchiveError("Распакованные данные блока не совпадают (CRC32)")
+    return data
+
+def _stream_executor(threads):
+    """Пул потоков для подпотоков блока
+
+    По умолчанию пул создаётся только в сборках CPython без GIL:
+    с GIL потоки не ускоряют чисто питоновское декодирование.
+    """
+    if threads is None:
+        gil_enabled = getattr(sys, '_is_gil_enabled', lambda: True)()
+        threads = 0 if gil_enabled else None
+    if threads == 0:
+        return None
+    from concurrent.futures import ThreadPoolExecutor
+    return ThreadPoolExecutor(threads)
+
+def decompress_file(input_path, output_path, threads=None):
+    """Распаковка файла
+
+    threads - число потоков для декодирования подпотоков блока
+    (0 - без потоков, None - по умолчанию, см. _stream_executor).
+    """
+    log(f"Чтение {input_path}...")
+    with open_stream(input_path, 'rb') as f, open_stream(output_path, 'wb') as out:
+        head = f.read(len(MAGIC))
+        if head != MAGIC:
+            log("Восстановление дерева...")
+            legacy = io.BytesIO(head + f.read())
+            coder, length = _read_legacy(legacy)
+            
+            log(f"Распаковка {length} символов...")
+            reader = BitReader(legacy.read())
+            out.write(''.join(coder.decode_with_table(reader, length)).encode('utf-8'))
+        else:
+            log("Восстановление дерева...")
+            model, version = _read_header(f)
+            
+            log(f"Распаковка в {output_path}...")
+            executor = _stream_executor(threads)
+            blocks = 0
+            try:
+                while True:
+                    block = _read_block(f, version)
+                    if block is None:
+                        break
+                    out.write(_decode_block(model, *block, executor=executor))
+                    blocks += 1
+                    log(f"\rБлоков: {blocks}", end='')
+            finally:
+                if executor is not None:
+                    executor.shutdown()
+            log()
+            
+            # За маркером конца - индекс и 8 байт его смещения
+            # (смещение сверяется, если поток - не канал)
+            try:
+                index_offset = f.tell()
+            except (OSError, io.UnsupportedOperation):
+                index_offset = None
+            if len(_read_index(f)) != blocks:
+                raise ArchiveError("Индекс не совпадает с блоками")
+            trailer = f.read(9)
+            if len(trailer) != 8:
+                raise ArchiveError("Архив обрезан или повреждён после индекса")
+            if index_offset is not None and int.from_bytes(trailer, 'big') != index_offset:
+                raise ArchiveError("Смещение индекса повреждено")
+    
+    log(f"\n✓ Готово!")
+
+_verify_model = None
+
+def _init_verify(path):
+    """Чтение заголовка архива в рабочем процессе проверки"""
+    global _verify_model
+    with open(path, 'rb') as f:
+        f.seek(len(MAGIC))
+        _verify_model, _ = _read_header(f)
+
+def _verify_block(path, offset, end, full, version):
+    """Проверка одного блока, возвращает текст ошибки или None"""
+    try:
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            block = _read_block(f, version)
+            if block is None or f.tell() != end:
+                raise ArchiveError("Границы блока не совпадают с индексом")
+            if full:
+                _decode_block(_verify_model, *block)
+    except ArchiveError as e:
+        return str(e)
+    return None
+
+def verify_file(input_path, full=False, jobs=None):
+    """Проверка архива без записи результата
+
+    Проверяются CRC32 заголовка, индекса и сжатых данных каждого блока;
+    при full=True блоки ещё и декодируются со сверкой CRC32 исходного
+    текста. Блоки проверяются параллельно (потоки для CRC, процессы
+    для полного декодирования). Возвращает True, если архив цел.
+    """
+    from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+    
+    if input_path == '-':
+        raise ValueError("Проверке нужен файл с произвольным доступом, а не stdin")
+    
+    log(f"Проверка {input_path}...")
+    with open(input_path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ArchiveError("Не архив (или архив старого формата без CRC)")
+        _, version = _read_header(f)
+        blocks_start = f.tell()
+        
+        # Индекс
+        file_size = f.seek(0, 2)
+        if file_size < blocks_start + 8:
+            raise ArchiveError("Архив обрезан")
+        f.seek(file_size - 8)
+        index_offset = int.from_bytes(f.read(8), 'big')
+        if not blocks_start < index_offset <= file_size - 12:
+            raise ArchiveError("Архив обрезан или индекс повреждён")
+        f.seek(index_offset - 1)
+        if f.read(1) != b'\0':
+            raise ArchiveError("Маркер конца блоков повреждён")
+        offsets = _read_index(f)
+        if f.tell() != file_size - 8:
+            raise ArchiveError("Индекс повреждён (CRC32)")
     
-    # Декодируем
-    reader = BitReader(encoded_data)
-    result = coder.decode_with_tree(reader, length)
+    # Блок заканчивается там, где начинается следующий; за последним - маркер конца
+    ends = offsets[1:] + [index_offset - 1]
+    if offsets and offsets[0] != blocks_start:
+        raise ArchiveError("Индекс не совпадает с блоками")
     
-    print(f"Запись в {output_path}...", flush=True)
-    with open(output_path, 'w', encoding='utf-8') as f:
-        f.write(''.join(result))
+    if full:
+        executor = ProcessPoolExecutor(jobs, initializer=_init_verify, initargs=(input_path,))
+    else:
+        executor = ThreadPoolExecutor(jobs)
     
-    print(f"\n✓ Готово!")
+    errors = 0
+    with executor:
+        results = executor.map(_verify_block, [input_path] * len(offsets), offsets, ends,
+                               [full] * len(offsets), [version] * len(offsets))
+        for i, error in enumerate(results):
+            if error:
+                errors += 1
+                log(f"  Блок {i} (смещение {offsets[i]}): {error}")
+    
+    if errors:
+        log(f"\n✗ Повреждено блоков: {errors} из {len(offsets)}")
+        return False
+    
+    log(f"\n✓ Архив цел: блоков {len(offsets)}" + (", декодирование проверено" if full else ""))
+    return True
+
+def parse_options(args, allowed):
+    """Разбор необязательных аргументов вида --ключ=значение
+
+    allowed - ключи, допустимые в данном режиме; остальные - ошибка.
+    """
+    options = {}
+    for arg in args:
+        if not arg.startswith('--'):
+            raise ValueError(f"Неизвестный аргумент: {arg}")
+        key, _, value = arg[2:].partition('=')
+        if key not in allowed:
+            raise ValueError(f"Неизвестный параметр: --{key} (допустимы: "
+                             + ', '.join(f'--{name}' for name in allowed) + ")")
+        options[key] = value
+    return options
 
 if __name__ == "__main__":
-    print("=== Кодирование Хаффмана ===\n", flush=True)
+    log("=== Кодирование Хаффмана ===\n")
     
-    if len(sys.argv) < 4:
-        print("Использование:")
-        print("  python huffman.py compress input.txt output.bin")
-        print("  python huffman.py decompress input.bin output.txt")
+    if len(sys.argv) < 3 or (sys.argv[1] != "verify" and len(sys.argv) < 4):
+        log("Использование:")
+        log("  python huffman.py compress input.txt output.bin [--order=0|1] [--merge=words|digrams] [--streams=N]")
+        log("                     [--backend=huffman|tans] [--sample=МБ]")
+        log("  python huffman.py decompress input.bin output.txt [--threads=N]")
+        log("  python huffman.py verify input.bin [--full] [--jobs=N]")
+        log("Вместо input/output можно указать '-' (stdin/stdout).")
         sys.exit(1)
     
-    mode, input_file, output_file = sys.argv[1:4]
+    mode, input_file = sys.argv[1:3]
     
     try:
-        if mode == "compress":
-            compress_file(input_file, output_file)
+        if mode == "verify":
+            options = parse_options(sys.argv[3:], ('full', 'jobs'))
+            jobs = int(options['jobs']) if options.get('jobs') else None
+            if not verify_file(input_file, full='full' in options, jobs=jobs):
+                sys.exit(2)
+        elif mode == "compress":
+            output_file = sys.argv[3]
+            options = parse_options(sys.argv[4:],
+                                    ('order', 'merge', 'streams', 'backend', 'sample'))
+            compress_file(input_file, output_file, order=int(options.get('order', 0)),
+                          merge=options.get('merge'), streams=int(options.get('streams', 1)),
+                          backend=options.get('backend', 'huffman'),
+                          sample=int(float(options['sample']) * (1 << 20)) if options.get('sample') else None)
         elif mode == "decompress":
-            decompress_file(input_file, output_file)
+            output_file = sys.argv[3]
+            options = parse_options(sys.argv[4:], ('threads',))
+            threads = int(options['threads']) if options.get('threads') else None
+            decompress_file(input_file, output_file, threads=threads)
         else:
-            print("Режим: compress или decompress")
+            log("Режим: compress, decompress или verify")
+            sys.exit(1)
     except FileNotFoundError:
-        print(f"Файл '{input_file}' не найден!")
+        log(f"Файл '{input_file}' не найден!")
+        sys.exit(1)
+    except ArchiveError as e:
+        log(f"Архив повреждён: {e}")
+        sys.exit(2)
     except Exception as e:
-        print(f"Ошибка: {e}")
+        log(f"Ошибка: {e}")
         import traceback
-        traceback.print_exc()
\ No newline at end of file
+        traceback.print_exc()
+        sys.exit(1)
\ No newline at end of file
@@ -1,11 +1,56 @@
 import sys
+import os
+import queue
+import threading
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox, scrolledtext
+from collections import Counter
 from pathlib import Path
 import math
 
 # Импортируем классы из huffman.py
-from huffman import HuffmanCoder, compress_file, decompress_file
+from huffman import (HuffmanCoder, compress_file, decompress_file, read_sample,
+                     read_text_chunks, SAMPLE_WINDOWS, SAMPLE_WINDOW)
+
+# Сколько байт начала файла показывать в окне текста
+PREVIEW_SIZE = 64 * 1024
+
+
+def sample_histogram(path, windows=SAMPLE_WINDOWS, window=SAMPLE_WINDOW):
+    """Гистограмма символов по выборке из файла
+
+    Возвращает (частоты, точно ли). Файлы не больше выборки считаются
+    целиком; для больших частоты выборки масштабируются на размер файла.
+    """
+    with open(path, 'rb') as f:
+        text, _, exact = read_sample(f, windows * window, windows)
+    if exact:
+        return Counter(text), True
+    
+    scale = os.path.getsize(path) / (windows * window)
+    return Counter({char: max(1, round(count * scale))
+                    for char, count in Counter(text).items()}), False
+
+
+def count_histogram(path, progress=None, cancel=None):
+    """Точная гистограмма символов файла, читаемого порциями
+
+    progress(прочитано, всего) вызывается после каждой порции. Если
+    установлено событие cancel, подсчёт прерывается и возвращается None.
+    """
+    size = os.path.getsize(path)
+    counts = Counter()
+    done = 0
+    
+    with open(path, 'rb') as f:
+        for chunk, text in read_text_chunks(f):
+            if cancel is not None and cancel.is_set():
+                return None
+            counts.update(text)
+            done += chunk
+            if chunk and progress is not None:
+                progress(done, size)
+    return counts
 
 
 class TreeVisualizer(tk.Canvas):
@@ -28,7 +73,7 @@ class TreeVisualizer(tk.Canvas):
         self.drag_start_y = 0
         
         # Данные дерева
-        self.tree_root = None
+        self.tree = None
         self.node_positions = {}
         
         # Привязка событий
@@ -74,91 +119,87 @@ class TreeVisualizer(tk.Canvas):
         
         self.draw_tree()
     
-    def set_tree(self, tree_root):
-        """Установка дерева для визуализации"""
-        self.tree_root = tree_root
-        self.scale_factor = 1.0
-        self.offset_x = 0
-        self.offset_y = 0
+    def set_tree(self, tree, reset_view=True):
+        """Установка дерева (HuffmanTree) для визуализации"""
+        self.tree = tree
+        if reset_view:
+            self.scale_factor = 1.0
+            self.offset_x = 0
+            self.offset_y = 0
         
         # Задержка для корректного получения размеров canvas
         self.after(100, self.draw_tree)
     
     def calculate_tree_width(self, node):
         """Вычисление количества листьев в поддереве"""
-        if node is None:
+        if node < 0:
             return 0
         
-        if node.left is None and node.right is None:
+        if self.tree.is_leaf(node):
             return 1
         
-        left_width = self.calculate_tree_width(node.left)
-        right_width = self.calculate_tree_width(node.right)
+        left_width = self.calculate_tree_width(self.tree.left[node])
+        right_width = self.calculate_tree_width(self.tree.right[node])
         
         return left_width + right_width
     
     def get_tree_bounds(self, node, x, y):
         """Получение границ поддерева (минимальный и максимальный X)"""
-        if node is None:
-            return x, x
-        
-        if node.left is None and node.right is None:
+        if node < 0 or self.tree.is_leaf(node):
             return x, x
         
         min_x = x
         max_x = x
         
-        if node.left:
-            left_min, left_max = self.get_tree_bounds(node.left, x, y)
-            min_x = min(min_x, left_min)
-            max_x = max(max_x, left_max)
-        
-        if node.right:
-            right_min, right_max = self.get_tree_bounds(node.right, x, y)
-            min_x = min(min_x, right_min)
-            max_x = max(max_x, right_max)
+        for child in (self.tree.left[node], self.tree.right[node]):
+            if child >= 0:
+                child_min, child_max = self.get_tree_bounds(child, x, y)
+                min_x = min(min_x, child_min)
+                max_x = max(max_x, child_max)
         
         return min_x, max_x
     
     def calculate_positions(self, node, x, y, next_leaf_x=[0]):
         """Улучшенное рекурсивное вычисление позиций узлов"""
-        if node is None:
+        if node < 0:
             return x, x
         
-        if node.left is None and node.right is None:
+        if self.tree.is_leaf(node):
             # Листовой узел - размещаем на следующей доступной позиции
             leaf_x = next_leaf_x[0]
             next_leaf_x[0] += self.min_horizontal_spacing
-            self.node_positions[id(node)] = (leaf_x, y)
+            self.node_positions[node] = (leaf_x, y)
             return leaf_x, leaf_x
         
         # Внутренний узел - сначала размещаем детей
         next_y = y + self.level_height
+        left = self.tree.left[node]
+        right = self.tree.right[node]
         
         left_min = left_max = x
         right_min = right_max = x
         
-        if node.left:
-            left_min, left_max = self.calculate_positions(node.left, x, next_y, next_leaf_x)
+        if left >= 0:
+            left_min, left_max = self.calculate_positions(left, x, next_y, next_leaf_x)
         
-        if node.right:
-            right_min, right_max = self.calculate_positions(node.right, x, next_y, next_leaf_x)
+        if right >= 0:
+            right_min, right_max = self.calculate_positions(right, x, next_y, next_leaf_x)
         
         # Размещаем текущий узел по центру между крайними потомками
-        if node.left and node.right:
+        if left >= 0 and right >= 0:
             node_x = (left_min + right_max) / 2
-        elif node.left:
+        elif left >= 0:
             node_x = (left_min + left_max) / 2
-        elif node.right:
+        elif right >= 0:
             node_x = (right_min + right_max) / 2
         else:
             node_x = x
         
-        self.node_positions[id(node)] = (node_x, y)
+        self.node_positions[node] = (node_x, y)
         
         # Возвращаем границы поддерева
-        min_x = left_min if node.left else node_x
-        max_x = right_max if node.right else node_x
+        min_x = left_min if left >= 0 else node_x
+        max_x = right_max if right >= 0 else node_x
         
         return min_x, max_x
     
@@ -166,7 +207,7 @@ class TreeVisualizer(tk.Canvas):
         """Отрисовка дерева"""
         self.delete('all')
         
-        if self.tree_root is None:
+        if self.tree is None:
             self.create_text(
                 self.winfo_width() // 2,
                 self.winfo_height() // 2,
@@ -181,7 +222,7 @@ class TreeVisualizer(tk.Canvas):
         
         # Вычисляем позиции с новым алгоритмом
         next_leaf_x = [0]  # Используем список для передачи по ссылке
-        min_x, max_x = self.calculate_positions(self.tree_root, 0, 50, next_leaf_x)
+        min_x, max_x = self.calculate_positions(self.tree.root, 0, 50, next_leaf_x)
         
         # Вычисляем смещение для центрирования дерева
         tree_width = max_x - min_x
@@ -191,22 +232,22 @@ class TreeVisualizer(tk.Canvas):
         center_offset = (canvas_width / 2) - (min_x + tree_width / 2)
         
         # Применяем смещение ко всем узлам
-        for node_id, (x, y) in list(self.node_positions.items()):
-            self.node_positions[node_id] = (x + center_offset, y)
+        for node, (x, y) in list(self.node_positions.items()):
+            self.node_positions[node] = (x + center_offset, y)
         
         # Рисуем дерево
-        self._draw_node(self.tree_root)
+        self._draw_node(self.tree.root)
     
     def _draw_node(self, node, parent_pos=None):
         """Рекурсивная отрисовка узла и его детей"""
-        if node is None:
+        if node < 0 or node not in self.node_positions:
             return
         
-        node_id = id(node)
-        if node_id not in self.node_positions:
-            return
-        
-        x, y = self.node_positions[node_id]
+        x, y = self.node_positions[node]
+        left = self.tree.left[node]
+        right = self.tree.right[node]
+        char = self.tree.char(node)
+        freq = self.tree.weight[node]
         
         # Применяем трансформации
         x = x * self.scale_factor + self.offset_x
@@ -214,58 +255,54 @@ class TreeVisualizer(tk.Canvas):
         radius = self.node_radius * self.scale_factor
         
         # Рисуем линии к детям
-        if node.left:
-            left_id = id(node.left)
-            if left_id in self.node_positions:
-                left_x, left_y = self.node_positions[left_id]
-                left_x = left_x * self.scale_factor + self.offset_x
-                left_y = left_y * self.scale_factor + self.offset_y
-                
-                self.create_line(
-                    x, y + radius,
-                    left_x, left_y - radius,
-                    width=2 * self.scale_factor,
-                    fill='#2c3e50',
-                    tags='edge'
-                )
-                # Подпись "0"
-                mid_x = (x + left_x) / 2
-                mid_y = (y + left_y) / 2
-                self.create_text(
-                    mid_x - 10 * self.scale_factor,
-                    mid_y,
-                    text='0',
-                    font=('Arial', int(12 * self.scale_factor), 'bold'),
-                    fill='#e74c3c'
-                )
-        
-        if node.right:
-            right_id = id(node.right)
-            if right_id in self.node_positions:
-                right_x, right_y = self.node_positions[right_id]
-                right_x = right_x * self.scale_factor + self.offset_x
-                right_y = right_y * self.scale_factor + self.offset_y
-                
-                self.create_line(
-                    x, y + radius,
-                    right_x, right_y - radius,
-                    width=2 * self.scale_factor,
-                    fill='#2c3e50',
-                    tags='edge'
-                )
-                # Подпись "1"
-                mid_x = (x + right_x) / 2
-                mid_y = (y + right_y) / 2
-                self.create_text(
-                    mid_x + 10 * self.scale_factor,
-                    mid_y,
-                    text='1',
-                    font=('Arial', int(12 * self.scale_factor), 'bold'),
-                    fill='#27ae60'
-                )
+        if left in self.node_positions:
+            left_x, left_y = self.node_positions[left]
+            left_x = left_x * self.scale_factor + self.offset_x
+            left_y = left_y * self.scale_factor + self.offset_y
+            
+            self.create_line(
+                x, y + radius,
+                left_x, left_y - radius,
+                width=2 * self.scale_factor,
+                fill='#2c3e50',
+                tags='edge'
+            )
+            # Подпись "0"
+            mid_x = (x + left_x) / 2
+            mid_y = (y + left_y) / 2
+            self.create_text(
+                mid_x - 10 * self.scale_factor,
+                mid_y,
+                text='0',
+                font=('Arial', int(12 * self.scale_factor), 'bold'),
+                fill='#e74c3c'
+            )
+        
+        if right in self.node_positions:
+            right_x, right_y = self.node_positions[right]
+            right_x = right_x * self.scale_factor + self.offset_x
+            right_y = right_y * self.scale_factor + self.offset_y
+            
+            self.create_line(
+                x, y + radius,
+                right_x, right_y - radius,
+                width=2 * self.scale_factor,
+                fill='#2c3e50',
+                tags='edge'
+            )
+            # Подпись "1"
+            mid_x = (x + right_x) / 2
+            mid_y = (y + right_y) / 2
+            self.create_text(
+                mid_x + 10 * self.scale_factor,
+                mid_y,
+                text='1',
+                font=('Arial', int(12 * self.scale_factor), 'bold'),
+                fill='#27ae60'
+            )
         
         # Определяем цвет узла
-        if node.char is not None:
+        if char is not None:
             # Листовой узел
             color = '#3498db'
             text_color = 'white'
@@ -285,9 +322,9 @@ class TreeVisualizer(tk.Canvas):
         )
         
         # Текст в узле
-        if node.char is not None:
+        if char is not None:
             # Для листа показываем символ
-            display_char = repr(node.char)[1:-1] if node.char != ' ' else '␣'
+            display_char = repr(char)[1:-1] if char != ' ' else '␣'
             if len(display_char) > 3:
                 display_char = display_char[:3]
             
@@ -300,7 +337,7 @@ class TreeVisualizer(tk.Canvas):
             )
             self.create_text(
                 x, y + 8 * self.scale_factor,
-                text=str(node.freq),
+                text=str(freq),
                 font=('Arial', int(9 * self.scale_factor)),
                 fill=text_color,
                 tags='text'
@@ -309,15 +346,15 @@ class TreeVisualizer(tk.Canvas):
             # Для внутреннего узла показываем частоту
             self.create_text(
                 x, y,
-                text=str(node.freq),
+                text=str(freq),
                 font=('Arial', int(11 * self.scale_factor), 'bold'),
                 fill=text_color,
                 tags='text'
             )
         
         # Рекурсивно рисуем детей
-        self._draw_node(node.left, (x, y))
-        self._draw_node(node.right, (x, y))
+        self._draw_node(left, (x, y))
+        self._draw_node(right, (x, y))
 
 
 class HuffmanGUI:
@@ -330,6 +367,10 @@ class HuffmanGUI:
         
         self.coder = HuffmanCoder()
         self.current_text = ''
+        self.freq = {}
+        
+        # Фоновый подсчёт частот: событие отмены текущего подсчёта
+        self.count_cancel = None
         
         self.setup_ui()
         
@@ -371,6 +412,19 @@ class HuffmanGUI:
         )
         self.tree_canvas.pack(fill=tk.BOTH, expand=True)
         
+        # Окно текста (для больших файлов - только начало)
+        preview_frame = ttk.LabelFrame(left_frame, text='📝 Текст', padding=5)
+        preview_frame.pack(fill=tk.X, padx=5, pady=5)
+        
+        self.preview_text = scrolledtext.ScrolledText(
+            preview_frame,
+            height=6,
+            font=('Courier', 9),
+            wrap=tk.WORD,
+            state=tk.DISABLED
+        )
+        self.preview_text.pack(fill=tk.X)
+        
         # Правая панель (таблица и управление)
         right_frame = ttk.Frame(main_container)
         main_container.add(right_frame, weight=1)
@@ -419,6 +473,15 @@ class HuffmanGUI:
             command=self.reset_view
         ).pack(fill=tk.X, pady=2)
         
+        # Состояние фонового подсчёта частот
+        self.status_var = tk.StringVar()
+        ttk.Label(
+            control_frame,
+            textvariable=self.status_var,
+            font=('Arial', 9),
+            foreground='gray'
+        ).pack(fill=tk.X, pady=(10, 0))
+        
         # Статистика
         stats_frame = ttk.LabelFrame(right_frame, text='Статистика', padding=10)
         stats_frame.pack(fill=tk.X, padx=5, pady=5)
@@ -460,7 +523,12 @@ class HuffmanGUI:
         scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
         
     def load_text(self):
-        """Загрузка текста из файла"""
+        """Загрузка текста из файла
+
+        Сразу показывается начало файла и приблизительное дерево по
+        выборке; точные частоты считаются в фоновом потоке, после чего
+        дерево уточняется.
+        """
         filename = filedialog.askopenfilename(
             title='Выберите текстовый файл',
             filetypes=[('Text files', '*.txt'), ('All files', '*.*')]
@@ -470,17 +538,91 @@ class HuffmanGUI:
             return
         
         try:
-            with open(filename, 'r', encoding='utf-8') as f:
-                self.current_text = f.read()
-            
-            if not self.current_text:
+            size = os.path.getsize(filename)
+            if size == 0:
                 messagebox.showwarning('Предупреждение', 'Файл пустой!')
                 return
             
-            self.build_tree()
+            self.cancel_count()
+            self.show_preview(filename, size)
+            freq, exact = sample_histogram(filename)
             
         except Exception as e:
             messagebox.showerror('Ошибка', f'Не удалось загрузить файл:\n{e}')
+            return
+        
+        self.current_text = ''
+        self.show_freq(freq, approximate=not exact)
+        
+        if exact:
+            self.status_var.set('')
+        else:
+            self.start_count(filename)
+    
+    def show_preview(self, filename, size):
+        """Показ первых PREVIEW_SIZE байт файла в окне текста"""
+        with open(filename, 'rb') as f:
+            preview = f.read(PREVIEW_SIZE).decode('utf-8', errors='ignore')
+        if size > PREVIEW_SIZE:
+            preview += f'\n… (показаны первые {PREVIEW_SIZE // 1024} КБ из {size // 1024} КБ)'
+        self.set_preview(preview)
+    
+    def set_preview(self, text):
+        self.preview_text.configure(state=tk.NORMAL)
+        self.preview_text.delete('1.0', tk.END)
+        self.preview_text.insert('1.0', text)
+        self.preview_text.configure(state=tk.DISABLED)
+    
+    def start_count(self, filename):
+        """Запуск точного подсчёта частот в фоновом потоке"""
+        cancel = threading.Event()
+        results = queue.Queue()
+        self.count_cancel = cancel
+        self.status_var.set('Приблизительное дерево, подсчёт частот: 0%')
+        
+        def progress(done, total):
+            results.put(('progress', done * 100 // total))
+        
+        def worker():
+            try:
+                results.put(('done', count_histogram(filename, progress, cancel)))
+            except Exception as e:
+                results.put(('error', e))
+        
+        threading.Thread(target=worker, daemon=True).start()
+        self.root.after(100, self.poll_count, results, cancel)
+    
+    def poll_count(self, results, cancel):
+        """Приём сообщений фонового подсчёта (Tk трогаем только из главного потока)"""
+        if cancel.is_set():
+            return
+        
+        try:
+            while True:
+                kind, value = results.get_nowait()
+                if kind == 'progress':
+                    self.status_var.set(f'Приблизительное дерево, подсчёт частот: {value}%')
+                elif kind == 'done':
+                    self.count_cancel = None
+                    self.status_var.set('')
+                    self.show_freq(value, approximate=False, reset_view=False)
+                    return
+                else:
+                    self.count_cancel = None
+                    self.status_var.set('')
+                    messagebox.showerror('Ошибка', f'Не удалось подсчитать частоты:\n{value}')
+                    return
+        except queue.Empty:
+            pass
+        
+        self.root.after(100, self.poll_count, results, cancel)
+    
+    def cancel_count(self):
+        """Остановка фонового подсчёта, если он идёт"""
+        if self.count_cancel is not None:
+            self.count_cancel.set()
+            self.count_cancel = None
+            self.status_var.set('')
     
     def enter_text(self):
         """Ручной ввод текста"""
@@ -505,6 +647,8 @@ class HuffmanGUI:
             self.current_text = text_widget.get('1.0', tk.END).strip()
             if self.current_text:
                 dialog.destroy()
+                self.cancel_count()
+                self.set_preview(self.current_text)
                 self.build_tree()
             else:
                 messagebox.showwarning('Предупреждение', 'Введите текст!')
@@ -520,18 +664,23 @@ class HuffmanGUI:
         if not self.current_text:
             return
         
+        self.show_freq(Counter(self.current_text))
+    
+    def show_freq(self, freq, approximate=False, reset_view=True):
+        """Построение дерева, таблицы и статистики по таблице частот"""
         try:
             # Строим дерево
-            freq = self.coder.build_codes(self.current_text)
+            self.freq = freq
+            self.coder.build_codes_from_freq(freq)
             
             # Обновляем визуализацию
-            self.tree_canvas.set_tree(self.coder.tree)
+            self.tree_canvas.set_tree(self.coder.tree, reset_view)
             
             # Обновляем таблицу
             self.update_table()
             
             # Обновляем статистику
-            self.update_statistics(freq)
+            self.update_statistics(freq, approximate)
             
         except Exception as e:
             messagebox.showerror('Ошибка', f'Не удалось построить дерево:\n{e}')
@@ -563,34 +712,34 @@ class HuffmanGUI:
             else:
                 display_char = repr(char)[1:-1]
             
-            # Получаем частоту
-            freq = sum(1 for c in self.current_text if c == char)
-            
-            self.code_table.insert('', tk.END, values=(display_char, code, freq))
+            self.code_table.insert('', tk.END, values=(display_char, code, self.freq[char]))
     
-    def update_statistics(self, freq):
+    def update_statistics(self, freq, approximate=False):
         """Обновление статистики"""
         self.stats_text.delete('1.0', tk.END)
         
-        total_chars = len(self.current_text)
+        total_chars = sum(freq.values())
         unique_chars = len(freq)
         
         # Вычисляем размеры
         original_bits = total_chars * 8
         
-        encoded_bits = sum(len(self.coder.codes[char]) for char in self.current_text)
+        encoded_bits = sum(count * len(self.coder.codes[char]) for char, count in freq.items())
         
         compression_ratio = (1 - encoded_bits / original_bits) * 100 if original_bits > 0 else 0
         
         # Средняя длина кода
         avg_code_length = encoded_bits / total_chars if total_chars > 0 else 0
         
-        stats = f"""Символов: {total_chars}
-Уникальных: {unique_chars}
-Исходный размер: {original_bits} бит
-Сжатый размер: {encoded_bits} бит
-Сжатие: {compression_ratio:.1f}%
-Средняя длина кода: {avg_code_length:.2f} бит"""
+        # Для дерева по выборке все величины - оценки
+        mark = '≈' if approximate else ''
+        
+        stats = f"""Символов: {mark}{total_chars}
+Уникальных: {mark}{unique_chars}
+Исходный размер: {mark}{original_bits} бит
+Сжатый размер: {mark}{encoded_bits} бит
+Сжатие: {mark}{compression_ratio:.1f}%
+Средняя длина кода: {mark}{avg_code_length:.2f} бит"""
         
         self.stats_text.insert('1.0', stats)
     